@@ -6,10 +6,11 @@ import logging
 import os
 from os.path import abspath
 from sys import exit
-from typing import List
+from typing import List, Optional
 
 import prometheus_client
 from mysql.connector import connect, MySQLConnection
+from mysql.connector.pooling import MySQLConnectionPool
 from prometheus_client import Info
 
 from covidbot.bot import Bot
@@ -37,8 +38,23 @@ def get_connection(cfg, autocommit=False) -> MySQLConnection:
     return connection
 
 
+def get_connection_pool(cfg, pool_name: str, autocommit=False) -> MySQLConnectionPool:
+    # Sessions are not modified, so there is no need to reset them when a connection is returned
+    pool = MySQLConnectionPool(pool_name=pool_name,
+                               pool_size=cfg['DATABASE'].getint('POOL_SIZE', fallback=4),
+                               pool_reset_session=False,
+                               database=cfg['DATABASE'].get('DATABASE'),
+                               user=cfg['DATABASE'].get('USER'),
+                               password=cfg['DATABASE'].get('PASSWORD'),
+                               port=cfg['DATABASE'].get('PORT'),
+                               host=cfg['DATABASE'].get('HOST', 'localhost'),
+                               autocommit=autocommit)
+    return pool
+
+
 class MessengerBotSetup:
     connections: List[MySQLConnection] = []
+    visualization: Optional[Visualization] = None
     name: str
     config: configparser.ConfigParser
 
@@ -100,8 +116,15 @@ class MessengerBotSetup:
         self.connections.append(monitor_conn)
 
         data = CovidData(data_conn)
+        # Only messengers sending reports to many users create graphs in parallel
+        pool = None
+        if self.name in ["signal", "threema", "telegram", "messenger", "matrix"]:
+            pool = get_connection_pool(self.config, f"{self.name}-visualization", autocommit=True)
         visualization = Visualization(data_conn,
-                                      self.config['GENERAL'].get('CACHE_DIR', 'graphics'))
+                                      self.config['GENERAL'].get('CACHE_DIR', 'graphics'),
+                                      pool=pool,
+                                      image_format="webp" if self.name in ["signal", "matrix"] else "jpg")
+        self.visualization = visualization
         user_manager = UserManager(self.name, user_conn,
                                    activated_default=users_activated)
         bot = Bot(user_manager, data, visualization, command_formatter=command_format,
@@ -235,13 +258,14 @@ class MessengerBotSetup:
             from covidbot.interfaces.facebook_interface import FacebookInterface
             return FacebookInterface(self.config['FACEBOOK'].get('PAGE_ID'),
                                      self.config['FACEBOOK'].get('PAGE_ACCESS_TOKEN'),
-                                     self.config['GENERAL'].get('WEB_DIR'),
-                                     self.config['GENERAL'].get('PUBLIC_URL'),
                                      user_manager, data, visualization,
                                      no_write=self.config['FACEBOOK'].getboolean('DEBUG',
                                                                                  fallback=False))
 
     def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.visualization:
+            self.visualization.close()
+
         for db_conn in self.connections:
             db_conn.close()
 
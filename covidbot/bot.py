@@ -676,12 +676,12 @@ Stand: {data.date.strftime("%d.%m.%Y")}
 Daten vom Robert Koch-Institut (RKI), Lizenz: dl-de/by-2-0.
 Weitere Informationen findest Du im <a href="https://corona.rki.de/">Dashboard des RKI</a>'''
 
-        graphs = [self.visualization.infections_graph(location.id, 9999),
-                  self.visualization.incidence_graph(location.id, 9999)]
+        graphs = [self.visualization.submit(self.visualization.infections_graph, location.id, 9999),
+                  self.visualization.submit(self.visualization.incidence_graph, location.id, 9999)]
 
         if self.covid_data.get_icu_data(location.id):
-            graphs.append(self.visualization.icu_graph(location.id))
-        return [BotResponse(message, images=graphs)]
+            graphs.append(self.visualization.submit(self.visualization.icu_graph, location.id))
+        return [BotResponse(message, images=[graph.result() for graph in graphs])]
 
     def currentDataHandler(self, user_input: str, user_id: int) -> List[BotResponse]:
         BOT_COMMAND_COUNT.labels('district_data').inc()
@@ -690,8 +690,9 @@ Weitere Informationen findest Du im <a href="https://corona.rki.de/">Dashboard d
         if not type(location) == District:
             return location
 
-        graphics = [self.visualization.infections_graph(location.id),
-                    self.visualization.incidence_graph(location.id)]
+        # Graphics are created while the message is assembled
+        graphics = [self.visualization.submit(self.visualization.infections_graph, location.id),
+                    self.visualization.submit(self.visualization.incidence_graph, location.id)]
         current_data = self.covid_data.get_district_data(location.id)
         sources = [f'Infektionsdaten vom {current_data.date.strftime("%d.%m.%Y")}. '
                    f'Infektionsdaten und R-Wert vom Robert Koch-Institut (RKI), '
@@ -770,13 +771,13 @@ Weitere Informationen findest Du im <a href="https://corona.rki.de/">Dashboard d
             sources.append(
                 f'Intensivbettenauslastung vom {current_data.icu_data.date.strftime("%d.%m.%Y")}. '
                 f'Daten vom <a href="https://intensivregister.de">DIVI-Intensivregister</a>.')
-            graphics.append(self.visualization.icu_graph(current_data.id))
+            graphics.append(self.visualization.submit(self.visualization.icu_graph, current_data.id))
 
         related_vaccinations = None
         if current_data.vaccinations:
             related_vaccinations = current_data.vaccinations
             message += "<b>💉 Impfdaten</b>\n"
-            graphics.append(self.visualization.vaccination_graph(location.id))
+            graphics.append(self.visualization.submit(self.visualization.vaccination_graph, location.id))
         else:
             if current_data.parent:
                 parent_district = self.covid_data.get_district_data(current_data.parent)
@@ -823,7 +824,7 @@ Weitere Informationen findest Du im <a href="https://corona.rki.de/">Dashboard d
             .format(info_command=self.command_formatter("Info"),
                     date=current_data.date.strftime("%d.%m.%Y"))
 
-        return [BotResponse(message, graphics)]
+        return [BotResponse(message, [graphic.result() for graphic in graphics])]
 
     def reportHandler(self, user_input: str, user_id: int) -> List[BotResponse]:
         BOT_COMMAND_COUNT.labels('report').inc()
@@ -1089,8 +1090,15 @@ Weitere Informationen findest Du im <a href="https://corona.rki.de/">Dashboard d
         self.user_manager.set_platform_user_number(
             self.user_manager.get_user_number(self.user_manager.platform))
 
-        for user in self.user_manager.get_all_user(with_subscriptions=True):
-            for t in self.report_generator.get_available_reports(user):
+        users = self.user_manager.get_all_user(with_subscriptions=True)
+        reports = {user.id: self.report_generator.get_available_reports(user) for user in users}
+
+        # Create the graphs of all infection reports at once, instead of one by one for each report
+        self.visualization.warm_cache(self.report_generator.get_infection_reports_graphs(
+            [user for user in users if MessageType.CASES_GERMANY in reports[user.id]]))
+
+        for user in users:
+            for t in reports[user.id]:
                 yield t, user.platform_id, self.report_generator.generate_report(user, t)
 
             if not user.activated:
@@ -1,7 +1,7 @@
 import logging
 import math
 from datetime import date, timedelta, datetime
-from typing import List, Optional, Dict, Union
+from typing import List, Optional, Dict, Union, Iterable
 
 from mysql.connector import MySQLConnection
 
@@ -65,6 +65,17 @@ class CovidData(object):
             data = cursor.fetchone()
             return District(data['county_name'], id=district_id, type=data['type'], parent=data['parent'])
 
+    def get_districts(self, district_ids: Iterable[int]) -> Dict[int, District]:
+        district_ids = list(set(district_ids))
+        if not district_ids:
+            return {}
+
+        with self.connection.cursor(dictionary=True) as cursor:
+            cursor.execute(f'SELECT rs, county_name, type, parent FROM counties '
+                           f'WHERE rs IN ({", ".join(["%s"] * len(district_ids))})', district_ids)
+            return {row['rs']: District(row['county_name'], id=row['rs'], type=row['type'], parent=row['parent'])
+                    for row in cursor.fetchall()}
+
     def get_children_data(self, district_id: int) -> Optional[List[DistrictData]]:
         with self.connection.cursor(dictionary=True) as cursor:
             cursor.execute('SELECT rs FROM counties WHERE parent=%s', [int(district_id)])
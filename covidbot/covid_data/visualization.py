@@ -1,359 +1,473 @@
 import datetime
+import hashlib
 import logging
 import math
 import os
-from functools import reduce
-from typing import Optional, Tuple, List
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, Future
+from contextlib import contextmanager
+from functools import lru_cache, partial
+from typing import Optional, Tuple, List, Dict, Iterator, Callable, Iterable, Set
 
 import matplotlib.dates as mdates
-import matplotlib.pyplot as plt
 import matplotlib.ticker
-from matplotlib import gridspec
+import numpy as np
 from matplotlib.axes import Axes
-from matplotlib.cbook import get_sample_data
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import PolyCollection
 from matplotlib.figure import Figure
-from matplotlib.offsetbox import OffsetImage, AnnotationBbox
 from mysql.connector import MySQLConnection
+from mysql.connector.pooling import MySQLConnectionPool
+from PIL import Image
 
-from covidbot import utils
 from covidbot.metrics import CACHED_GRAPHS, CREATED_GRAPHS
 from covidbot.utils import format_int, format_float
 
+# Creating a figure is expensive, so cleared figures are kept for the next plot with the same size and dpi
+_FIGURE_POOL: Dict[Tuple[Tuple[float, float], float], List[Figure]] = defaultdict(list)
+_FIGURE_POOL_LOCK = threading.Lock()
+
+# Drawing is not thread safe in matplotlib, e.g. the font cache is shared
+_RENDER_LOCK = threading.Lock()
+
+# Users switch between the recent and the complete history of a district, so the other one is rendered in advance
+PREFETCH_DURATIONS = [49, 9999]
+
+# 8x5 inches result in 1280x800 pixels, the largest photo size messengers like Telegram deliver without downscaling
+DPI = 160
+
+# Fixed layout in figure coordinates, the same for both figure sizes
+PLOT_RECT = (0.125, 0.2458427, 0.775, 0.6341573)
+SOURCE_POSITION = (0.125, 0.0281)
+LINK_POSITION = (0.3985, 0.0281)
+# Top right corner of the logo
+LOGO_POSITION = (0.9, 0.1045)
+
+# Keep Pillow on its fast path: no extra Huffman pass, no progressive encoding and 4:2:0 chroma subsampling
+JPEG_OPTIONS = {'quality': 75, 'optimize': False, 'progressive': False, 'subsampling': 2}
+
+# WebP graphics are about half the size of the JPEGs, but not every messenger displays them as photos
+WEBP_OPTIONS = {'quality': 80, 'method': 4}
+
+IMAGE_FORMATS = {'jpg': ('JPEG', JPEG_OPTIONS), 'webp': ('WEBP', WEBP_OPTIONS)}
+
+
+def _figure_key(figure: Figure) -> Tuple[Tuple[float, float], float]:
+    width, height = figure.get_size_inches()
+    return (float(width), float(height)), float(figure.dpi)
+
+
+@lru_cache(maxsize=1024)
+def _format_german_number(value: float) -> str:
+    """Label for a y axis tick, cached as the same tick values recur on most graphics"""
+    if value > 999999:
+        return str(value / 1000000).replace(".", ",") + " Mio."
+    # Same as utils.format_int, inlined as matplotlib calls this for every tick
+    return f"{int(value):,}".replace(",", ".")
+
 
 class Visualization:
     connection: MySQLConnection
+    pool: Optional[MySQLConnectionPool]
     graphics_dir: str
     log = logging.getLogger(__name__)
     disable_cache: bool
 
-    def __init__(self, connection: MySQLConnection, directory: str, disable_cache: bool = False) -> None:
+    # Annotations copy these, so they can be shared. Formatters and locators are bound to their axis and are created
+    # for every plot, as graphs are rendered from several threads.
+    _LABEL_BBOX = dict(boxstyle='round', facecolor='#ffffff', alpha=0.7, edgecolor='#ffffff')
+    _LABEL_ARROW = dict(arrowstyle="-", facecolor='black')
+
+    def __init__(self, connection: MySQLConnection, directory: str, disable_cache: bool = False,
+                 pool: Optional[MySQLConnectionPool] = None, image_format: str = 'jpg') -> None:
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(f"Unsupported image format {image_format}")
+
         self.connection = connection
+        self.pool = pool
+        self._render_executor = None
+        self._prefetch_executor = None
+        self._prefetching = threading.local()
+        self._render_thread = threading.local()
+        if pool:
+            # MySQLConnectionPool raises instead of waiting if it is exhausted
+            self._pool_slots = threading.BoundedSemaphore(pool.pool_size)
+            self._render_executor = ThreadPoolExecutor(max_workers=pool.pool_size, thread_name_prefix="graph-render",
+                                                       initializer=self._mark_render_thread)
+            # Prefetching needs its own connections, the shared one can not be used from other threads
+            self._prefetch_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="graph-prefetch")
         if not os.path.exists(directory):
             os.makedirs(directory)
         if not os.path.isdir(directory):
             raise NotADirectoryError(f"Path {directory} is not a directory")
 
         self.graphics_dir = directory
+        # Resolved once, os.path.abspath would call getcwd() for every graph
+        self._graphics_path = os.path.abspath(directory)
         self.disable_cache = disable_cache
-
-    @staticmethod
-    def setup_plot(current_date: Optional[datetime.date], title: str, y_label: str,
+        self.image_format = image_format
+        # Names and populations of districts do not change while the bot is running
+        self._districts: Dict[int, Tuple[str, int]] = {}
+        # Graphs are never changed once written, so paths seen once do not need another stat() call
+        self._known_graphs: Set[str] = set()
+
+        # D64 logo shown on every graphic, decoded and scaled only once. It is pasted onto the rendered graphic, so
+        # matplotlib does not have to resample and composite it for every graph
+        with Image.open(os.path.abspath('resources/d64-logo.png')) as logo:
+            # Same size as an OffsetImage with a zoom of 0.3, which is scaled by dpi / 72
+            scale = 0.3 * DPI / 72
+            self._logo = logo.convert('RGBA').resize((round(logo.width * scale), round(logo.height * scale)),
+                                                     Image.LANCZOS)
+
+    @contextmanager
+    def _get_connection(self) -> Iterator[MySQLConnection]:
+        """Borrows a connection from the pool, falls back to the shared connection if no pool is configured"""
+        if not self.pool:
+            yield self.connection
+            return
+
+        with self._pool_slots:
+            connection = self.pool.get_connection()
+            try:
+                yield connection
+            finally:
+                # Returns the connection to the pool
+                connection.close()
+
+    def _graph_path(self, name: str) -> str:
+        return os.path.join(self._graphics_path, f"{name}.{self.image_format}")
+
+    def _is_cached(self, graph_type: str, filepath: str) -> bool:
+        """Checks whether a graphic has already been rendered and counts the cache hit or miss"""
+        if not self.disable_cache and (filepath in self._known_graphs or os.path.isfile(filepath)):
+            self._known_graphs.add(filepath)
+            CACHED_GRAPHS.labels(type=graph_type).inc()
+            return True
+        CREATED_GRAPHS.labels(type=graph_type).inc()
+        return False
+
+    def _get_latest_date(self, query: str, district_id: int) -> Optional[datetime.date]:
+        """Runs a cheap MAX() query to find out whether a cached graphic is still up to date"""
+        with self._get_connection() as connection, connection.cursor() as cursor:
+            cursor.execute(query, [district_id])
+            return cursor.fetchall()[0][0]
+
+    def setup_plot(self, current_date: Optional[datetime.date], title: str, y_label: str,
                    source: str = "Robert-Koch-Institut", quadratic: bool = False) -> Tuple[Figure, Axes]:
         figsize = (8, 5)
         if quadratic:
             figsize = (8, 8)
 
-        fig = plt.figure(figsize=figsize, dpi=200)
-        gs = gridspec.GridSpec(15, 3)
-
+        with _FIGURE_POOL_LOCK:
+            pooled = _FIGURE_POOL[(figsize, DPI)]
+            if pooled:
+                fig = pooled.pop()
+            else:
+                # Graphics are only written to files, so the figure is not registered with pyplot and rendered by Agg
+                fig = Figure(figsize=figsize, dpi=DPI)
+                FigureCanvasAgg(fig)
+        # The footer is drawn on the figure to not create an axes for each part
         if current_date:
-            # Second subplot just for Source and current date
-            ax2 = fig.add_subplot(gs[14, 0])
-            plt.axis('off')
-            ax2.annotate("Stand: {date}\nQuelle: {source}"
-                         .format(date=current_date.strftime("%d.%m.%Y"), source=source),
-                         color="#6e6e6e",
-                         xy=(0, -4.5), xycoords='axes fraction',
-                         horizontalalignment='left',
-                         verticalalignment='bottom')
-
-        # Third subplot for Link
-        ax3 = fig.add_subplot(gs[14:, 1])
-        plt.axis('off')
-
-        ax3.annotate("Tägliche Updates:\n"
-                     "https://covidbot.d-64.org",
+            # Source and current date
+            fig.text(*SOURCE_POSITION,
+                     "Stand: {date}\nQuelle: {source}".format(date=current_date.strftime("%d.%m.%Y"), source=source),
                      color="#6e6e6e",
-                     xy=(0, -4.5), xycoords='axes fraction',
                      horizontalalignment='left',
                      verticalalignment='bottom')
 
-        # 4th subplot for Logo
-        ax4 = fig.add_subplot(gs[14:, 2])
-        plt.axis('off')
+        # Link
+        fig.text(*LINK_POSITION,
+                 "Tägliche Updates:\n"
+                 "https://covidbot.d-64.org",
+                 color="#6e6e6e",
+                 horizontalalignment='left',
+                 verticalalignment='bottom')
 
-        # Annotate the 2nd position with D64 logo
-        with get_sample_data(os.path.abspath('resources/d64-logo.png')) as logo:
-            arr_img = plt.imread(logo, format='png')
-
-        imagebox = OffsetImage(arr_img, zoom=0.3)
-        imagebox.image.axes = ax4
-
-        ab = AnnotationBbox(imagebox, xy=(0, 0), frameon=False, xybox=(1, -2.5), xycoords='axes fraction',
-                            box_alignment=(1, 1))
-
-        ax4.add_artist(ab)
-
-        ax1 = fig.add_subplot(gs[:14, :])
+        ax1 = fig.add_axes(PLOT_RECT)
 
         # Set title and labels
         fig.suptitle(title, fontweight="bold")
-        plt.ylabel(y_label)
+        ax1.set_ylabel(y_label)
 
         # Styling
-        for direction in ["left", "right", "bottom", "top"]:
-            ax1.spines[direction].set_visible(False)
-        plt.grid(axis="y", zorder=0)
+        ax1.spines[:].set_visible(False)
+        ax1.grid(axis="y", zorder=0)
         fig.patch.set_facecolor("#eeeeee")
         ax1.patch.set_facecolor("#eeeeee")
-        fig.subplots_adjust(bottom=0.2)
 
         # Ticks also on right side
         ax1.tick_params(axis="y", labelleft=True, labelright=True, grid_color="#666666")
+        ax1.tick_params(axis="x", labelrotation=30)
 
         return fig, ax1
 
-    @staticmethod
-    def teardown_plt(figure: Figure):
+    def teardown_plt(self, figure: Figure, filepath: str):
+        # Write to a temporary file first, so a concurrent cache lookup never returns a partially written graphic
+        tmp_filepath = f"{filepath}.{threading.get_ident()}.tmp"
+        pil_format, options = IMAGE_FORMATS[os.path.splitext(filepath)[1][1:]]
+        try:
+            with _RENDER_LOCK:
+                # Draw on the Agg canvas directly instead of going through pyplot's savefig
+                figure.canvas.draw()
+                image = Image.fromarray(np.asarray(figure.canvas.buffer_rgba())[..., :3])
+            x, y = LOGO_POSITION
+            image.paste(self._logo, (round(x * image.width) - self._logo.width, round((1 - y) * image.height)),
+                        self._logo)
+            image.save(tmp_filepath, format=pil_format, dpi=(figure.dpi, figure.dpi), **options)
+            os.replace(tmp_filepath, filepath)
+        except Exception:
+            # Do not leave a partially written graphic behind
+            if os.path.exists(tmp_filepath):
+                os.remove(tmp_filepath)
+            raise
+        self._known_graphs.add(filepath)
         figure.clf()
-        plt.close(figure)
+        with _FIGURE_POOL_LOCK:
+            _FIGURE_POOL[_figure_key(figure)].append(figure)
+
+    def _get_district(self, district_id: int) -> Tuple[str, int]:
+        """Returns name and population of a district, only queried once per district"""
+        district = self._districts.get(district_id)
+        if district is None:
+            with self._get_connection() as connection, connection.cursor() as cursor:
+                cursor.execute("SELECT county_name, population FROM counties WHERE rs=%s", [district_id])
+                district = self._districts[district_id] = cursor.fetchall()[0]
+        return district
+
+    def submit(self, graph: Callable[..., str], *args) -> Future:
+        """Creates a graph in the background if a connection pool is available, so several graphs can be created at
+        once. Without a pool, the graph is created immediately and returned as a finished Future."""
+        if self._render_executor:
+            return self._render_executor.submit(graph, *args)
+
+        future = Future()
+        try:
+            future.set_result(graph(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def close(self) -> None:
+        """Waits for graphs still being created and closes the connections of the pool"""
+        for executor in [self._prefetch_executor, self._render_executor]:
+            if executor:
+                executor.shutdown(wait=True)
+
+        if self.pool:
+            # MySQLConnectionPool has no public way to close its connections
+            self.pool._remove_connections()
+
+    def _mark_render_thread(self) -> None:
+        self._render_thread.active = True
+
+    def _prefetch(self, graph, district_id: int, duration: int) -> None:
+        """Renders the other durations of a freshly created graph in the background"""
+        if not self._prefetch_executor or self.disable_cache or duration not in PREFETCH_DURATIONS:
+            return
+
+        # Graphs rendered by a prefetch do not queue further prefetches
+        if getattr(self._prefetching, 'active', False):
+            return
+
+        for other_duration in PREFETCH_DURATIONS:
+            if other_duration != duration:
+                self._prefetch_executor.submit(self._run_prefetch, graph, district_id, other_duration)
+
+    def _run_prefetch(self, graph: Callable[..., Optional[str]], *args) -> None:
+        self._prefetching.active = True
+        try:
+            graph(*args)
+        except Exception as e:
+            self.log.warning(f"Could not prefetch {graph.__name__} for {args}: {e}")
+        finally:
+            self._prefetching.active = False
+
+    def warm_cache(self, graphs: Iterable[Tuple[Callable[..., Optional[str]], tuple]]) -> None:
+        """Creates the given graphs at once, so sending reports only has to look them up. Each graph is given as a
+        graph method and its arguments, duplicates are only created once."""
+        if self.disable_cache:
+            return
+
+        # Failures are only logged, the graph is created again once a report needs it
+        futures = [self.submit(self._run_prefetch, graph, *args) for graph, args in set(graphs)]
+        for future in futures:
+            future.result()
 
     def infections_graph(self, district_id: int, duration: int = 49, quadratic=False) -> str:
-        district_name, current_date, x_data, y_data = self._get_covid_data("new_cases", district_id, duration)
-
-        filepath = os.path.abspath(
-            os.path.join(self.graphics_dir, f"infections-{current_date.isoformat()}-{district_id}-{duration}.jpg"))
+        current_date = self._get_latest_date('SELECT MAX(date) FROM covid_data_calculated WHERE rs=%s', district_id)
+        # Districts without any data get an empty graph
+        date_key = current_date.isoformat() if current_date else "no-data"
+        filepath = self._graph_path(f"infections-{date_key}-{district_id}-{duration}")
 
         # Do not draw new graphic if its cached
-        if not self.disable_cache and os.path.isfile(filepath):
-            CACHED_GRAPHS.labels(type='infections').inc()
+        if self._is_cached('infections', filepath):
             return filepath
-        CREATED_GRAPHS.labels(type='infections').inc()
+
+        district_name, _, x_data, y_data = self._get_covid_data("new_cases", district_id, duration)
 
         fig, ax1 = self.setup_plot(current_date, f"Neuinfektionen {district_name}", "Neuinfektionen",
                                    quadratic=quadratic)
         # Plot data
-        plt.xticks(x_data, rotation='30', ha='right')
-        bars = plt.bar(x_data, y_data, color="#1fa2de", width=0.8, zorder=3)
-        props = dict(boxstyle='round', facecolor='#ffffff', alpha=0.7, edgecolor='#ffffff')
+        x_num = mdates.date2num(x_data)
+        self.plot_bars(ax1, x_num, y_data)
 
         # Add a label every 7 days
         if duration < 70:
-            for i in range(0, len(bars), 7):
-                rect = bars[i]
-                height = rect.get_height()
-                ax1.annotate(format_int(int(height)),
-                             xy=(rect.get_x() + rect.get_width() / 2., height),
-                             xytext=(0, 30), textcoords='offset points',
-                             arrowprops=dict(arrowstyle="-", facecolor='black'),
-                             horizontalalignment='center', verticalalignment='top', bbox=props)
-
-            self.set_weekday_formatter(ax1, current_date.weekday())
+            self.label_bars(ax1, x_num[::7], y_data[::7])
+            self.set_weekday_formatter(ax1, (current_date or datetime.date.today()).weekday())
         else:
             self.set_monthly_formatter(ax1)
 
         # Save to file
-        plt.savefig(filepath, format='JPEG')
-        self.teardown_plt(fig)
+        self.teardown_plt(fig, filepath)
+        self._prefetch(self.infections_graph, district_id, duration)
         return filepath
 
     def vaccination_speed_graph(self, district_id: int, duration: int = 49, quadratic=False) -> str:
-        with self.connection.cursor(dictionary=True) as cursor:
+        current_date = self._get_latest_date('SELECT MAX(date) FROM covid_vaccinations WHERE district_id=%s',
+                                             district_id)
+        filepath = self._graph_path(f"vaccination-speed-{current_date.isoformat()}-{district_id}-{duration}")
+
+        # Do not draw new graphic if its cached
+        if self._is_cached('vaccination-speed', filepath):
+            return filepath
+
+        with self._get_connection() as connection, connection.cursor() as cursor:
             oldest_date = datetime.date.today() - datetime.timedelta(days=duration)
-            cursor.execute('SELECT c.county_name as name, date, doses_diff FROM covid_vaccinations '
+            cursor.execute('SELECT date, COALESCE(doses_diff, 0), c.county_name FROM covid_vaccinations '
                            'LEFT JOIN counties c on c.rs = covid_vaccinations.district_id '
                            'WHERE district_id=%s AND date > %s ORDER BY date', [district_id, oldest_date])
             x_data = []
             y_data = []
-            current_date = None
             district_name = None
-            for row in cursor.fetchall():
-                if row['doses_diff'] is None:
-                    row['doses_diff'] = 0
-                y_data.append(row['doses_diff'])
-                x_data.append(row['date'])
-                if not current_date or row['date'] > current_date:
-                    current_date = row['date']
-                    district_name = row['name']
-
-        filepath = os.path.abspath(
-            os.path.join(self.graphics_dir,
-                         f"vaccination-speed-{current_date.isoformat()}-{district_id}-{duration}.jpg"))
-
-        # Do not draw new graphic if its cached
-        if not self.disable_cache and os.path.isfile(filepath):
-            CACHED_GRAPHS.labels(type='vaccination-speed').inc()
-            return filepath
-        CREATED_GRAPHS.labels(type='vaccination-speed').inc()
+            for date, doses, district_name in cursor:
+                x_data.append(date)
+                y_data.append(doses)
 
         fig, ax1 = self.setup_plot(current_date, f"Impfungen {district_name}", "Verimpfte Dosen",
                                    quadratic=quadratic)
         # Plot data
-        plt.xticks(x_data, rotation='30', ha='right')
+        x_num = mdates.date2num(x_data)
+        self.plot_bars(ax1, x_num, y_data)
 
         # Add a label every 7 days
-        bars = plt.bar(x_data, y_data, color="#1fa2de", width=0.8, zorder=3)
-        props = dict(boxstyle='round', facecolor='#ffffff', alpha=0.7, edgecolor='#ffffff')
-        for i in range(len(bars) - 1, 0, -7):
-            rect = bars[i]
-            height = rect.get_height()
-            ax1.annotate(format_int(int(height)),
-                         xy=(rect.get_x() + rect.get_width() / 2., height),
-                         xytext=(0, 30), textcoords='offset points',
-                         arrowprops=dict(arrowstyle="-", facecolor='black'),
-                         horizontalalignment='center', verticalalignment='top', bbox=props)
+        self.label_bars(ax1, x_num[:0:-7], y_data[:0:-7])
 
         self.set_weekday_formatter(ax1, current_date.weekday())
 
         # Save to file
-        plt.savefig(filepath, format='JPEG')
-        self.teardown_plt(fig)
+        self.teardown_plt(fig, filepath)
         return filepath
 
     def bot_user_graph(self) -> str:
         now = datetime.datetime.now()
         quarter = math.floor(now.hour / 4)
-        filepath = os.path.abspath(
-            os.path.join(self.graphics_dir, f"botuser-{now.strftime(f'%Y-%m-%d-{quarter}')}.jpg"))
-        if not self.disable_cache and os.path.isfile(filepath):
-            CACHED_GRAPHS.labels(type='botuser').inc()
+        filepath = self._graph_path(f"botuser-{now.strftime(f'%Y-%m-%d-{quarter}')}")
+        if self._is_cached('botuser', filepath):
             return filepath
-        CREATED_GRAPHS.labels(type='botuser').inc()
-
-        with self.connection.cursor(dictionary=True) as cursor:
-            cursor.execute("SELECT date, SUM(user) as count FROM platform_statistics GROUP BY date")
 
-            y_data = []
-            x_data = []
-            today = datetime.date.today()
-            current = None
-            for row in cursor.fetchall():
-                if not current:
-                    # noinspection PyUnusedLocal
-                    current = row['date']
-                else:
-                    while row['date'] != current + datetime.timedelta(days=1):
-                        current += datetime.timedelta(days=1)
-                        y_data.append(y_data[-1])
-                        x_data.append(current)
-                current = row['date']
-                y_data.append(row['count'])
-                x_data.append(row['date'])
-
-            if x_data:
-                while x_data[-1] != today:
-                    y_data.append(y_data[-1])
-                    x_data.append(x_data[-1] + datetime.timedelta(days=1))
-
-            fig, ax1 = self.setup_plot(None, f"Nutzer:innen des Covidbots", "Anzahl")
-            # Plot data
-            plt.xticks(x_data, rotation='30', ha='right')
-            ax1.fill_between(x_data, y_data, color="#1fa2de", zorder=3)
-
-            self.set_monthly_formatter(ax1)
+        with self._get_connection() as connection, connection.cursor() as cursor:
+            cursor.execute("SELECT date, SUM(user) as count FROM platform_statistics GROUP BY date ORDER BY date")
+            rows = cursor.fetchall()
 
-            # Save to file
-            plt.savefig(filepath, format='JPEG')
-            self.teardown_plt(fig)
-            return filepath
+        x_data, y_data = [], []
+        if rows:
+            days = np.array([row[0].toordinal() for row in rows])
+            first_day = days[0]
+            last_day = max(days[-1], datetime.date.today().toordinal())
 
-    def vaccination_graph(self, district_id: int) -> str:
-        with self.connection.cursor(dictionary=True) as cursor:
-            cursor.execute(
-                "SELECT vaccinated_partial, vaccinated_full, vaccinated_booster, date FROM covid_vaccinations WHERE district_id=%s ORDER BY date",
-                [district_id])
+            # Days without statistics keep the number of the previous day, until today
+            row_index = np.zeros(last_day - first_day + 1, dtype=np.int64)
+            row_index[days - first_day] = np.arange(len(rows))
+            y_data = np.array([row[1] for row in rows], dtype=np.int64)[np.maximum.accumulate(row_index)]
+            x_data = np.arange(np.datetime64(rows[0][0]), np.datetime64(datetime.date.fromordinal(last_day)) + 1)
 
-            y_data_booster = []
-            y_data_full = []
-            y_data_partial = []
-            x_data = []
-            for row in cursor.fetchall():
-                if not row['vaccinated_partial']:
-                    row['vaccinated_partial'] = 0
+        fig, ax1 = self.setup_plot(None, f"Nutzer:innen des Covidbots", "Anzahl")
+        # Plot data
+        x_num = mdates.date2num(x_data)
+        ax1.fill_between(x_num, y_data, color="#1fa2de", zorder=3)
 
-                if not row['vaccinated_full']:
-                    row['vaccinated_full'] = 0
+        self.set_monthly_formatter(ax1)
 
-                if not row['vaccinated_booster']:
-                    row['vaccinated_booster'] = 0
+        # Save to file
+        self.teardown_plt(fig, filepath)
+        return filepath
 
-                if len(y_data_partial) > 1 and y_data_partial[-1] > row['vaccinated_partial']:
-                    row['vaccinated_partial'] = y_data_partial[-1]
+    def vaccination_graph(self, district_id: int) -> str:
+        current_date = self._get_latest_date('SELECT MAX(date) FROM covid_vaccinations WHERE district_id=%s',
+                                             district_id)
+        filepath = self._graph_path(f"vaccinations-{current_date.isoformat()}-{district_id}")
 
-                if len(y_data_full) > 1 and y_data_full[-1] > row['vaccinated_full']:
-                    row['vaccinated_full'] = y_data_full[-1]
+        # Do not draw new graphic if its cached
+        if self._is_cached('vaccinations', filepath):
+            return filepath
 
-                if len(y_data_booster) > 1 and y_data_booster[-1] > row['vaccinated_booster']:
-                    row['vaccinated_booster'] = y_data_booster[-1]
+        with self._get_connection() as connection, connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT date, COALESCE(vaccinated_partial, 0), COALESCE(vaccinated_full, 0), "
+                "COALESCE(vaccinated_booster, 0) FROM covid_vaccinations WHERE district_id=%s ORDER BY date",
+                [district_id])
+            rows = cursor.fetchall()
 
-                y_data_partial.append(row['vaccinated_partial'])
-                y_data_full.append(row['vaccinated_full'])
-                y_data_booster.append(row['vaccinated_booster'])
+        x_data = [row[0] for row in rows]
 
-                x_data.append(row['date'])
+        # Cumulative numbers can not decrease, so carry the maximum forward to smooth corrections
+        vaccinations = np.maximum.accumulate(np.array([row[1:] for row in rows], dtype=np.int64), axis=0)
+        y_data_partial, y_data_full, y_data_booster = vaccinations.T
 
-            filepath = os.path.abspath(
-                os.path.join(self.graphics_dir, f"vaccinations-{x_data[-1].isoformat()}-{district_id}.jpg"))
+        district_name, population = self._get_district(district_id)
 
-            # Do not draw new graphic if its cached
-            if not self.disable_cache and os.path.isfile(filepath):
-                CACHED_GRAPHS.labels(type='vaccinations').inc()
-                return filepath
-            CREATED_GRAPHS.labels(type='vaccinations').inc()
+        source = "Robert-Koch-Institut"
+        fig, ax1 = self.setup_plot(current_date, f"Impfungen {district_name}", "Anzahl Impfungen", source=source)
+        # Plot data
+        x_num = mdates.date2num(x_data)
+        ax1.fill_between(x_num, y_data_partial, color="#1fa2de", zorder=3, label="Erstimpfungen")
 
-            cursor.execute("SELECT county_name, population FROM counties WHERE rs=%s", [district_id])
-            row = cursor.fetchone()
-            district_name = row['county_name']
-            population = row['population']
+        i = int(np.argmax(y_data_full > 0))
+        ax1.fill_between(x_num[i:], y_data_full[i:], color="#384955", zorder=3, label="Vollständige Erstimmunisierung")
 
-            source = "Robert-Koch-Institut"
-            fig, ax1 = self.setup_plot(x_data[-1], f"Impfungen {district_name}", "Anzahl Impfungen", source=source)
-            # Plot data
-            plt.xticks(x_data, rotation='30', ha='right')
-            ax1.fill_between(x_data, y_data_partial, color="#1fa2de", zorder=3, label="Erstimpfungen")
+        i = int(np.argmax(y_data_booster > 0))
+        ax1.fill_between(x_num[i:], y_data_booster[i:], color="#9DCCED", zorder=3, label="Auffrischungsimpfungen")
 
-            i = 0
-            while y_data_full[i] == 0:
-                i += 1
-            ax1.fill_between(x_data[i:], y_data_full[i:], color="#384955", zorder=3, label="Vollständige Erstimmunisierung")
+        ax1.legend(loc="upper left")
 
-            i = 0
-            while y_data_booster[i] == 0:
-                i += 1
-            ax1.fill_between(x_data[i:], y_data_booster[i:], color="#9DCCED", zorder=3, label="Auffrischungsimpfungen")
+        # Fix scale, so its always 100%
+        ax1.set_ylim(0, population)
 
-            ax1.legend(loc="upper left")
 
-            # Fix scale, so its always 100%
-            ax1.set_ylim(0, population)
+        if len(x_data) < 120:
+            self.set_weekday_formatter(ax1, x_data[-1].weekday())
+        else:
+            self.set_quarterly_formatter(ax1)
+
+        # Adapt left ticks to match percentages on the right
+        ticks = []
+        labels = []
+        for i in range(0, 6):
+            ticks.append(population * (i * 20/100))
+            labels.append(f"{round(population * (i * 20/100) / 1_000_000)} Mio.")
+        ax1.set_yticks(ticks, labels)
+
+        # Percentage on the right
+        secaxy = ax1.secondary_yaxis('right', functions=(lambda x: x / population * 100, lambda x: x * population / 100))
+        secaxy.set_ylabel('Anteil der Bevölkerung')
+        for direction in ["left", "right", "bottom", "top"]:
+            secaxy.spines[direction].set_visible(False)
+        secaxy.yaxis.set_major_formatter(lambda x, y: f'{int(x)}%')
 
+        ax1.tick_params(axis="y", labelright=False)
 
-            if len(x_data) < 120:
-                formatter = mdates.DateFormatter("%a, %d.%m.")
-                ax1.xaxis.set_major_locator(mdates.WeekdayLocator(byweekday=x_data[-1].weekday()))
-                ax1.xaxis.set_major_formatter(formatter)
-            else:
-                self.set_quarterly_formatter(ax1)
-            ax1.yaxis.set_major_formatter(self.tick_formatter_german_numbers)
-
-            # Adapt left ticks to match percentages on the right
-            ticks = []
-            labels = []
-            for i in range(0, 6):
-                ticks.append(population * (i * 20/100))
-                labels.append(f"{round(population * (i * 20/100) / 1_000_000)} Mio.")
-            ax1.set_yticks(ticks, labels)
-
-            # Percentage on the right
-            secaxy = ax1.secondary_yaxis('right', functions=(lambda x: x / population * 100, lambda x: x * population / 100))
-            secaxy.set_ylabel('Anteil der Bevölkerung')
-            for direction in ["left", "right", "bottom", "top"]:
-                secaxy.spines[direction].set_visible(False)
-            secaxy.yaxis.set_major_formatter(lambda x, y: f'{int(x)}%')
-
-            ax1.tick_params(axis="y", labelright=False)
-
-            # Save to file
-            plt.savefig(filepath, format='JPEG')
-            self.teardown_plt(fig)
-            return filepath
+        # Save to file
+        self.teardown_plt(fig, filepath)
+        return filepath
 
-    def multi_incidence_graph(self, district_ids: List[int], duration: int = 49) -> Optional[str]:
+    def multi_incidence_graph(self, district_ids: Iterable[int], duration: int = 49) -> Optional[str]:
+        district_ids = sorted(district_ids)
         if not district_ids:
             return None
 
         data = []
-        district_ids.sort()
 
         # Source: https://matplotlib.org/stable/gallery/lines_bars_and_markers/linestyles.html
         line_styles = [
@@ -361,48 +475,45 @@ class Visualization:
 
         line_colors = ['#393991', '#916047', '#6D6DDF', '#45291B', '#539140']
 
+        # Queries are independent, so run them in parallel on the render threads if we have a connection pool. On a
+        # render thread they run inline, as waiting for the other render threads could deadlock.
+        get_incidence = partial(self._get_covid_data, "incidence", duration=duration)
+        if self._render_executor and not getattr(self._render_thread, 'active', False):
+            results = list(self._render_executor.map(get_incidence, district_ids))
+        else:
+            results = [get_incidence(district_id) for district_id in district_ids]
+
         i = 0
-        max_y = None
-        for district in district_ids:
-            district_name, current_date, x_data, y_data = self._get_covid_data("incidence", district, duration)
-            if not x_data or not y_data:
+        for district, (district_name, current_date, x_data, y_data) in zip(district_ids, results):
+            if not len(x_data) or not len(y_data):
                 raise ValueError(f"Could not get data for {district}")
-            data.append({'name': district_name, 'x': x_data, 'y': y_data, 'date': current_date,
+            data.append({'name': district_name, 'x': mdates.date2num(x_data), 'y': y_data, 'date': current_date,
                          'linestyle': line_styles[i % len(line_styles)],
                          'linecolor': line_colors[i % len(line_colors)]})
             i += 1
-            if max_y is None:
-                max_y = max(y_data)
-            else:
-                max_y = max(y_data + [max_y])
 
         current_date = data[0].get('date')
-        identifier = reduce(lambda x, y: x + y, map(str, district_ids))
+        # Separate the ids, otherwise [1, 12] and [11, 2] share a file name
+        identifier = hashlib.blake2s(','.join(map(str, district_ids)).encode(), digest_size=8).hexdigest()
 
-        filepath = os.path.abspath(
-            os.path.join(self.graphics_dir,
-                         f"multi-incidence-{current_date.isoformat()}-duration-{duration}-{identifier}.jpg"))
+        filepath = self._graph_path(f"multi-incidence-{current_date.isoformat()}-duration-{duration}-{identifier}")
 
         # Do not draw new graphic if its cached
-        if not self.disable_cache and os.path.isfile(filepath):
-            CACHED_GRAPHS.labels(type='incidence').inc()
+        if self._is_cached('incidence', filepath):
             return filepath
-        CREATED_GRAPHS.labels(type='incidence').inc()
 
         fig, ax1 = self.setup_plot(current_date, f"7-Tage-Inzidenzen", "7-Tage-Inzidenz")
 
-        x_data = data[0].get('x')
         # Plot data
-        plt.xticks(x_data, rotation='30', ha='right')
 
         # Sort for legend, highest at first
         data.sort(key=lambda element: element.get('y')[-1], reverse=True)
         for d in data:
-            plt.plot(d.get('x'), d.get('y'), linestyle=d.get('linestyle'), color=d.get('linecolor'), zorder=3,
+            ax1.plot(d.get('x'), d.get('y'), linestyle=d.get('linestyle'), color=d.get('linecolor'), zorder=3,
                      linewidth=1, label=d.get('name'))
 
         # Add legend
-        plt.legend(loc="lower left")
+        ax1.legend(loc="lower left")
 
         ax1.set_ylim(bottom=0)
 
@@ -410,86 +521,78 @@ class Visualization:
         self.set_weekday_formatter(ax1, current_date.weekday())
 
         # Save to file
-        plt.savefig(filepath, format='JPEG')
-        self.teardown_plt(fig)
+        self.teardown_plt(fig, filepath)
         return filepath
 
     def incidence_graph(self, district_id: int, duration: int = 49) -> str:
-        district_name, current_date, x_data, y_data = self._get_covid_data("incidence", district_id, duration)
-        filepath = os.path.abspath(
-            os.path.join(self.graphics_dir, f"incidence-{current_date.isoformat()}-{district_id}-{duration}.jpg"))
+        current_date = self._get_latest_date('SELECT MAX(date) FROM covid_data_calculated WHERE rs=%s', district_id)
+        # Districts without any data get an empty graph
+        date_key = current_date.isoformat() if current_date else "no-data"
+        filepath = self._graph_path(f"incidence-{date_key}-{district_id}-{duration}")
 
         # Do not draw new graphic if its cached
-        if not self.disable_cache and os.path.isfile(filepath):
-            CACHED_GRAPHS.labels(type='incidence').inc()
+        if self._is_cached('incidence', filepath):
             return filepath
-        CREATED_GRAPHS.labels(type='incidence').inc()
+
+        district_name, _, x_data, y_data = self._get_covid_data("incidence", district_id, duration)
 
         fig, ax1 = self.setup_plot(current_date, f"7-Tage-Inzidenz {district_name}", "7-Tage-Inzidenz")
         # Plot data
-        plt.xticks(x_data, rotation='30', ha='right')
+        x_num = mdates.date2num(x_data)
 
         # Add a label every 7 days
-        plt.plot(x_data, y_data, color="#1fa2de", zorder=3, linewidth=3)
+        ax1.plot(x_num, y_data, color="#1fa2de", zorder=3, linewidth=3)
         ax1.set_ylim(bottom=0)
 
         if duration < 70:
-            self.set_weekday_formatter(ax1, current_date.weekday())
+            self.set_weekday_formatter(ax1, (current_date or datetime.date.today()).weekday())
         else:
             self.set_monthly_formatter(ax1)
 
         # Save to file
-        plt.savefig(filepath, format='JPEG')
-        self.teardown_plt(fig)
+        self.teardown_plt(fig, filepath)
+        self._prefetch(self.incidence_graph, district_id, duration)
         return filepath
 
     def icu_graph(self, district_id: int) -> Optional[str]:
-        current_date = None
         colors = ['#911425', '#DE354B', '#1fa2de', '']
-        y_data = {'covid-ventilated': [],
-                  'covid-not-ventilated': [],
-                  'no-covid': [],
-                  }
-        x_data = []
-
-        with self.connection.cursor(dictionary=True) as cursor:
-            cursor.execute(
-                'SELECT date, (clear + occupied) as total, clear, occupied, occupied_covid, covid_ventilated FROM icu_beds WHERE district_id=%s ORDER BY date',
-                [district_id])
-            for row in cursor.fetchall():
-                if row['occupied_covid'] is None or row['covid_ventilated'] is None or row['total'] == 0:
-                    continue
 
-                y_data['no-covid'].append((row['occupied'] - row['occupied_covid']) / row['total'] * 100)
-                y_data['covid-not-ventilated'].append(
-                    (row['occupied_covid'] - row['covid_ventilated']) / row['total'] * 100)
-                y_data['covid-ventilated'].append(row['covid_ventilated'] / row['total'] * 100)
+        current_date = self._get_latest_date(
+            'SELECT MAX(date) FROM icu_beds WHERE district_id=%s AND occupied_covid IS NOT NULL '
+            'AND covid_ventilated IS NOT NULL AND clear + occupied != 0', district_id)
+        filepath = self._graph_path(f"icu-{current_date.isoformat()}-{district_id}")
 
-                x_data.append(row['date'])
+        # Do not draw new graphic if its cached
+        if self._is_cached('icu', filepath):
+            return filepath
 
-                if not current_date or current_date < row['date']:
-                    current_date = row['date']
-            cursor.execute('SELECT county_name FROM counties WHERE rs=%s', [district_id])
-            district_name = cursor.fetchall()[0]['county_name']
+        with self._get_connection() as connection, connection.cursor() as cursor:
+            # Skip days without covid numbers or without reported beds
+            cursor.execute(
+                'SELECT date, clear + occupied, occupied, occupied_covid, covid_ventilated FROM icu_beds '
+                'WHERE district_id=%s AND occupied_covid IS NOT NULL AND covid_ventilated IS NOT NULL '
+                'AND clear + occupied != 0 ORDER BY date',
+                [district_id])
+            rows = cursor.fetchall()
+        district_name, _ = self._get_district(district_id)
 
-        filepath = os.path.abspath(
-            os.path.join(self.graphics_dir, f"icu-{current_date.isoformat()}-{district_id}.jpg"))
+        x_data = [row[0] for row in rows]
 
-        # Do not draw new graphic if its cached
-        if not self.disable_cache and os.path.isfile(filepath):
-            CACHED_GRAPHS.labels(type='icu').inc()
-            return filepath
-        CREATED_GRAPHS.labels(type='icu').inc()
+        total, occupied, occupied_covid, covid_ventilated = np.array([row[1:] for row in rows], dtype=np.float64).T
+        y_data = {'covid-ventilated': covid_ventilated / total * 100,
+                  'covid-not-ventilated': (occupied_covid - covid_ventilated) / total * 100,
+                  'no-covid': (occupied - occupied_covid) / total * 100,
+                  }
 
         fig, ax1 = self.setup_plot(current_date, f"Auslastung der Intensivstationen ({district_name})", "Auslastung",
                                    source="DIVI-Intensivregister")
 
         # Plot data
-        plt.xticks(x_data, rotation='30', ha='right')
-        ax1.stackplot(x_data, y_data.values(), colors=colors,
+        x_num = mdates.date2num(x_data)
+        ax1.stackplot(x_num, y_data.values(), colors=colors,
                       labels=['Covid (beatmet)', 'Covid (ohne Beatmung)', 'Andere'], zorder=0)
         # Add legend
-        plt.legend(loc='upper left')
+        ax1.legend(loc='upper left')
 
         ax1.set_ylim(bottom=0, top=100)
 
@@ -498,42 +601,34 @@ class Visualization:
         ax1.yaxis.set_major_formatter(matplotlib.ticker.PercentFormatter())
 
         # Save to file
-        # plt.show()
-        plt.savefig(filepath, format='JPEG')
-        self.teardown_plt(fig)
+        self.teardown_plt(fig, filepath)
         return filepath
 
     def hospitalization_graph(self, district_id: int, duration: int = 60, quadratic: bool = False) -> str:
-        x_data, y_data, current_date = [], [], None
-        with self.connection.cursor(dictionary=True) as cursor:
-            cursor.execute('SELECT date, incidence, updated FROM hospitalisation WHERE age=\'00+\' AND district_id=%s ORDER BY date DESC LIMIT %s', [district_id, duration])
-            for row in cursor.fetchall():
-                x_data.append(row['date'])
-                y_data.append(row['incidence'])
-
-                if current_date is None or current_date < row['updated']:
-                    current_date = row['updated']
-
-            cursor.execute('SELECT county_name, population FROM counties WHERE rs=%s', [district_id])
-            row = cursor.fetchone()
-            district_name = row['county_name']
-            population = row['population']
-
-        filepath = os.path.abspath(
-            os.path.join(self.graphics_dir, f"hospitalization-{current_date.isoformat()}-{district_id}-{duration}-{quadratic}.jpg"))
+        current_date = self._get_latest_date(
+            'SELECT MAX(updated) FROM hospitalisation WHERE age=\'00+\' AND district_id=%s', district_id)
+        filepath = self._graph_path(f"hospitalization-{current_date.isoformat()}-{district_id}-{duration}-{quadratic}")
 
         # Do not draw new graphic if its cached
-        if not self.disable_cache and os.path.isfile(filepath):
-            CACHED_GRAPHS.labels(type="hospitalization").inc()
+        if self._is_cached("hospitalization", filepath):
             return filepath
-        CREATED_GRAPHS.labels(type="hospitalization").inc()
+
+        x_data, y_data = [], []
+        with self._get_connection() as connection, connection.cursor() as cursor:
+            cursor.execute('SELECT date, incidence FROM hospitalisation WHERE age=\'00+\' AND district_id=%s '
+                           'ORDER BY date DESC LIMIT %s', [district_id, duration])
+            for date, incidence in cursor:
+                x_data.append(date)
+                y_data.append(incidence)
+
+        district_name, population = self._get_district(district_id)
 
         fig, ax1 = self.setup_plot(current_date, f"Hospitalisierung {district_name}", "7-Tage-Hospitalisierungsinzidenz", "Robert-Koch-Institut", quadratic)
         # Plot data
-        plt.xticks(x_data, rotation='30', ha='right')
+        x_num = mdates.date2num(x_data)
 
         # Add a label every 7 days
-        plt.plot(x_data, y_data, color="#1fa2de", zorder=3, linewidth=3)
+        ax1.plot(x_num, y_data, color="#1fa2de", zorder=3, linewidth=3)
         ax1.set_ylim(bottom=0)
         if duration < 70:
             self.set_weekday_formatter(ax1, current_date.weekday())
@@ -551,73 +646,92 @@ class Visualization:
 
         ax1.tick_params(axis="y", labelright=False)
         # Save to file
-        plt.savefig(filepath, format='JPEG')
-        self.teardown_plt(fig)
+        self.teardown_plt(fig, filepath)
         return filepath
 
     def _get_covid_data(self, field: str, district_id: int, duration: int) -> Tuple[
-        str, datetime.date, List[datetime.date], List[int]]:
-        district_name: Optional[str]
-        current_date: Optional[datetime.date]
-
-        with self.connection.cursor(dictionary=True) as cursor:
+        str, Optional[datetime.date], np.ndarray, np.ndarray]:
+        with self._get_connection() as connection, connection.cursor() as cursor:
             oldest_date = datetime.date.today() - datetime.timedelta(days=duration)
             cursor.execute(
-                f"SELECT {field}, county_name, date FROM covid_data_calculated WHERE rs=%s AND date >= %s ORDER BY date",
+                f"SELECT date, COALESCE({field}, 0), county_name FROM covid_data_calculated WHERE rs=%s AND date >= %s "
+                f"ORDER BY date",
                 [district_id, oldest_date])
+            rows = cursor.fetchall()
 
-            y_data = []
-            x_data = []
-            district_name = None
-            current_date = None
-            for row in cursor.fetchall():
-                if not district_name:
-                    district_name = row['county_name']
-
-                if not current_date:
-                    current_date = row['date']
-                else:
-                    while current_date + datetime.timedelta(days=1) != row['date']:
-                        # We do not have data for that day, so set -1
-                        current_date += datetime.timedelta(days=1)
-                        self.log.warning(f"We do not have data for requested {current_date}")
-                        x_data.append(current_date)
-                        y_data.append(0)
-                    current_date = row['date']
-
-                x_data.append(current_date)
-                if row[field]:
-                    y_data.append(row[field])
-                else:
-                    y_data.append(0)
+        if not rows:
+            # Still name the district on an empty graph
+            return self._get_district(district_id)[0], None, np.array([]), np.array([])
+
+        district_name = rows[0][2]
+        current_date = rows[-1][0]
+        days = np.array([row[0].toordinal() for row in rows])
+        first_day = days[0]
+
+        # Days without data are shown as 0
+        y_data = np.zeros(days[-1] - first_day + 1, dtype=np.float64)
+        y_data[days - first_day] = np.array([row[1] for row in rows], dtype=np.float64)
+        if len(y_data) != len(rows):
+            self.log.warning(f"We do not have data for {len(y_data) - len(rows)} requested days for {district_id}")
+
+        x_data = np.arange(np.datetime64(rows[0][0]), np.datetime64(current_date) + 1)
         return district_name, current_date, x_data, y_data
 
     def set_weekday_formatter(self, ax1, weekday):
         # One tick every 7 days for easier comparison
-        formatter = mdates.DateFormatter("%a, %d.%m.")
         ax1.xaxis.set_major_locator(mdates.WeekdayLocator(byweekday=weekday))
-        ax1.xaxis.set_major_formatter(formatter)
+        ax1.xaxis.set_major_formatter(mdates.DateFormatter("%a, %d.%m."))
         ax1.yaxis.set_major_formatter(self.tick_formatter_german_numbers)
+        self.align_date_labels(ax1)
 
     def set_monthly_formatter(self, ax1):
-        # One tick every 7 days for easier comparison
-        formatter = mdates.DateFormatter("%m/%y")
+        # One tick every month
         ax1.xaxis.set_major_locator(mdates.MonthLocator())
-        ax1.xaxis.set_major_formatter(formatter)
+        ax1.xaxis.set_major_formatter(mdates.DateFormatter("%m/%y"))
         ax1.yaxis.set_major_formatter(self.tick_formatter_german_numbers)
+        self.align_date_labels(ax1)
 
     def set_quarterly_formatter(self, ax1):
         # One tick every 3 months for easier comparison
-        formatter = mdates.DateFormatter("%m/%y")
         ax1.xaxis.set_major_locator(mdates.MonthLocator(interval=3))
-        ax1.xaxis.set_major_formatter(formatter)
+        ax1.xaxis.set_major_formatter(mdates.DateFormatter("%m/%y"))
         ax1.yaxis.set_major_formatter(self.tick_formatter_german_numbers)
         ax1.xaxis.set_minor_locator(mdates.MonthLocator())
+        self.align_date_labels(ax1)
+
+    @staticmethod
+    def plot_bars(ax: Axes, x_data: np.ndarray, y_data) -> None:
+        """Draws a bar chart like Axes.bar, but as a single collection instead of a Rectangle artist for each bar"""
+        left = x_data - 0.4
+        right = x_data + 0.4
+        bottom = np.zeros(len(x_data))
+        top = np.asarray(y_data, dtype=np.float64)
+        vertices = np.stack([np.column_stack(corner) for corner in
+                             [(left, bottom), (left, top), (right, top), (right, bottom)]], axis=1)
+
+        bars = PolyCollection(vertices, facecolors="#1fa2de", edgecolors="none", zorder=3)
+        # Like Axes.bar, the y axis starts at 0 without a margin
+        bars.sticky_edges.y.append(0)
+        ax.add_collection(bars)
+        ax.autoscale_view()
+
+    @classmethod
+    def label_bars(cls, ax: Axes, x_data: np.ndarray, y_data) -> None:
+        """Labels the given bars with their value in a box above them"""
+        for x, height in zip(x_data, y_data):
+            ax.annotate(format_int(int(height)), xy=(x, height), xytext=(0, 30), textcoords='offset points',
+                        arrowprops=cls._LABEL_ARROW, horizontalalignment='center', verticalalignment='top',
+                        bbox=cls._LABEL_BBOX)
+
+    @staticmethod
+    def align_date_labels(ax1):
+        # Ticks created while drawing copy the properties of the first tick, so this is only needed once the
+        # final locator is set
+        for label in ax1.get_xticklabels():
+            label.set_horizontalalignment('right')
 
     # noinspection PyUnusedLocal
     @staticmethod
     def tick_formatter_german_numbers(tick_value, position) -> str:
-        if tick_value > 999999:
-            tick_value = float(tick_value / 1000000)
-            return str(tick_value).replace(".", ",") + " Mio."
-        return utils.format_int(int(tick_value))
+        # The label does not depend on the position, so only the value is part of the cache key
+        return _format_german_number(tick_value)
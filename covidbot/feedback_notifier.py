@@ -1,13 +1,50 @@
+import asyncio
 import logging
 import time
-from typing import List, Union
+from typing import List, Union, Tuple
 
 from telegram import ParseMode
+from telegram.error import RetryAfter
 from telegram.ext import Updater
 
 from covidbot.interfaces.messenger_interface import MessengerInterface
 from covidbot.user_manager import UserManager
 
+# Telegram does not accept longer messages
+MAX_MESSAGE_LENGTH = 4096
+FEEDBACK_SEPARATOR = "\n\n"
+
+
+def split_notification(message: str) -> List[str]:
+    """Splits a notification that does not fit into a single message, at line breaks if possible"""
+    parts = []
+    while len(message) > MAX_MESSAGE_LENGTH:
+        split_at = message.rfind("\n", 0, MAX_MESSAGE_LENGTH + 1)
+        if split_at <= 0:
+            split_at = MAX_MESSAGE_LENGTH
+        parts.append(message[:split_at])
+        message = message[split_at:].lstrip("\n")
+    if message:
+        parts.append(message)
+    return parts
+
+
+def batch_notifications(notifications: List[Tuple[int, str]]) -> List[Tuple[List[int], str]]:
+    """Combines consecutive feedback notifications into as few Telegram messages as possible. Each message is returned
+    with the ids of the feedback that is completely sent once it went out."""
+    batches: List[Tuple[List[int], str]] = []
+    for feedback_id, notification in notifications:
+        parts = split_notification(notification)
+        for i, message in enumerate(parts):
+            # Feedback split into several messages is only confirmed with its last part
+            feedback_ids = [feedback_id] if i == len(parts) - 1 else []
+            if batches and len(batches[-1][1]) + len(FEEDBACK_SEPARATOR) + len(message) <= MAX_MESSAGE_LENGTH:
+                batch_ids, text = batches.pop()
+                batches.append((batch_ids + feedback_ids, text + FEEDBACK_SEPARATOR + message))
+            else:
+                batches.append((feedback_ids, message))
+    return batches
+
 
 class FeedbackNotifier(MessengerInterface):
     log = logging.getLogger(__name__)
@@ -19,13 +56,30 @@ class FeedbackNotifier(MessengerInterface):
 
     async def send_unconfirmed_reports(self) -> None:
         # This method is not used for daily reports, but to forward feedback to the developers
-        i = 0
-        for message in self.user_manager.get_feedback_notifications():
-            if i == 20:
-                time.sleep(1)
-            i += 1
-            self.updater.bot.send_message(chat_id=self.dev_chat_id, text=message, parse_mode=ParseMode.HTML,
-                                          timeout=10)
+        # Messages are sent one after another: all go to the same chat, which Telegram rate limits, and each feedback
+        # is only marked as sent once its message went out
+        loop = asyncio.get_running_loop()
+        sliding_flood_window = []
+        for feedback_ids, message in self.get_feedback_batches():
+            if len(sliding_flood_window) >= 20:
+                # We want to send 20 messages per second max
+                flood_window_diff = time.perf_counter() - sliding_flood_window.pop(0)
+                if flood_window_diff < 1.05:  # safety margin
+                    await asyncio.sleep(1.05 - flood_window_diff)
+
+            while True:
+                try:
+                    await loop.run_in_executor(None, lambda: self.updater.bot.send_message(
+                        chat_id=self.dev_chat_id, text=message, parse_mode=ParseMode.HTML, timeout=10))
+                    break
+                except RetryAfter as e:
+                    self.log.warning(f"Flood limit reached, retry in {e.retry_after}s")
+                    await asyncio.sleep(e.retry_after)
+            sliding_flood_window.append(time.perf_counter())
+            self.user_manager.confirm_feedback_notifications(feedback_ids)
+
+    def get_feedback_batches(self) -> List[Tuple[List[int], str]]:
+        return batch_notifications(self.user_manager.get_feedback_notifications())
 
     async def send_message_to_users(self, message: str, users: List[Union[str, int]]):
         raise NotImplementedError("This is just an interface to forward feedback from users to developers")
@@ -20,15 +20,12 @@ class BotResponse:
         if not self.choices:
             return self.message
 
-        message = self.message + '\n\n'
-        message += "<b>🙋 Mögliche Aktionen:</b>\n"
-        for choice in self.choices:
-            if choice.alt_text:
-                message += f'• {choice.alt_text}\n'
+        parts = [self.message, '\n\n', "<b>🙋 Mögliche Aktionen:</b>\n"]
+        parts.extend(f'• {choice.alt_text}\n' for choice in self.choices if choice.alt_text)
 
         if self.choices[0].alt_help:
-            message += f'\n{self.choices[0].alt_help}'
+            parts.append(f'\n{self.choices[0].alt_help}')
         else:
-            message += '\nDu kannst auch einen Ort oder einen anderen Befehl senden um fortzufahren'
+            parts.append('\nDu kannst auch einen Ort oder einen anderen Befehl senden um fortzufahren')
 
-        return message
+        return "".join(parts)
@@ -3,7 +3,8 @@ import logging
 import os
 import signal
 import traceback
-from typing import List, Union
+from collections import defaultdict
+from typing import List, Union, Dict, Tuple, Optional
 
 import prometheus_async
 from fbmessenger import Messenger
@@ -15,7 +16,7 @@ from covidbot.metrics import RECV_MESSAGE_COUNT, SENT_MESSAGE_COUNT, BOT_RESPONS
 from covidbot.bot import Bot
 from covidbot.settings import BotUserSettings
 from covidbot.user_hint_service import UserHintService
-from covidbot.utils import adapt_text, split_message
+from covidbot.utils import adapt_text, split_message, MessageType
 from covidbot.interfaces.bot_response import BotResponse
 
 
@@ -23,13 +24,20 @@ class FBMessengerInterface(MessengerInterface):
     bot: Bot
     fb_messenger: Messenger
     port: int
+    consecutive_errors: int
     log = logging.getLogger(__name__)
 
+    # Number of users that are sent messages to at the same time
+    MAX_CONCURRENT_USERS = 10
+    # Number of failed messages in a row after which the bot is restarted
+    MAX_CONSECUTIVE_ERRORS = 20
+
     def __init__(self, bot: Bot, access_token: str, verify_token: str, port: int, web_dir: str,
                  public_url: str):
         self.bot = bot
         self.fb_messenger = Messenger(access_token, verify_token, self.handle_messenger_msg, web_dir, public_url)
         self.port = port
+        self.consecutive_errors = 0
 
     def run(self):
         logging.info("Run Facebook Messenger Interface")
@@ -49,12 +57,14 @@ class FBMessengerInterface(MessengerInterface):
             if message.payload:
                 user_input = message.payload
             responses = self.bot.handle_input(user_input, message.sender_id)
+            disable_unicode = not self.bot.get_user_setting(message.sender_id, BotUserSettings.FORMATTING)
             for response in responses:
-                await self.send_bot_response(message.sender_id, response)
+                await self.send_bot_response(message.sender_id, response, disable_unicode)
+            self.consecutive_errors = 0
         except Exception as e:
+            self.consecutive_errors += 1
             self.log.exception("An error happened while handling a FB Messenger message", exc_info=e)
             self.log.exception(f"Message from {message.sender_id}: {message.text}")
-            self.log.exception("Exiting!")
             await self.fb_messenger.send_reply(message, adapt_text(self.bot.get_error_message().message))
 
             try:
@@ -66,13 +76,16 @@ class FBMessengerInterface(MessengerInterface):
             except Exception:
                 self.log.error(f"Could not send message to developers")
 
-            # Just exit on exception
-            os.kill(os.getpid(), signal.SIGINT)
+            # Single failures are usually caused by the message, only exit if the bot seems to be broken
+            if self.consecutive_errors >= self.MAX_CONSECUTIVE_ERRORS:
+                self.log.error("Exiting!")
+                os.kill(os.getpid(), signal.SIGINT)
 
-    async def send_bot_response(self, user: str, response: BotResponse):
+    async def send_bot_response(self, user: str, response: BotResponse, disable_unicode: Optional[bool] = None):
         if response.message:
             images = response.images
-            disable_unicode = not self.bot.get_user_setting(user, BotUserSettings.FORMATTING)
+            if disable_unicode is None:
+                disable_unicode = not self.bot.get_user_setting(user, BotUserSettings.FORMATTING)
             max_chars = 2000
             if response.choices:
                 max_chars = 640
@@ -80,38 +93,64 @@ class FBMessengerInterface(MessengerInterface):
             for i in range(0, len(messages)):
                 buttons = None
                 if response.choices and i == len(messages) - 1:
-                    buttons = []
-                    if len(response.choices) > 3:
-                        response.choices = response.choices[:3]
-                    for choice in response.choices:
-                        buttons.append(PostbackButton(choice.label, choice.callback_data))
+                    # Messenger shows at most 3 buttons, the response itself is left untouched
+                    buttons = [PostbackButton(choice.label, choice.callback_data) for choice in response.choices[:3]]
                 await self.fb_messenger.send_message(user, messages[i], images=images, buttons=buttons)
                 images = None
                 SENT_MESSAGE_COUNT.inc()
 
     async def send_unconfirmed_reports(self) -> None:
-        unconfirmed_reports = self.bot.get_available_user_messages()
-
-        for report, userid, message in unconfirmed_reports:
-            try:
-                for elem in message:
-                    await self.send_bot_response(userid, elem)
-                self.bot.confirm_message_send(report, userid)
-                self.log.warning(f"Sent report to {userid}")
-            except MessengerError as e:
-                self.log.exception(f"Can't send report: {e.code} {e.subcode} {e.message}", exc_info=e)
-                self.bot.disable_user(userid)
+        # Messages to the same user have to keep their order, so they are sent one after another
+        reports_by_user: Dict[str, List[Tuple[MessageType, List[BotResponse]]]] = defaultdict(list)
+        for report, userid, message in self.bot.get_available_user_messages():
+            reports_by_user[userid].append((report, message))
+
+        sending = asyncio.Semaphore(self.MAX_CONCURRENT_USERS)
+
+        async def send_reports(userid: str, reports: List[Tuple[MessageType, List[BotResponse]]]):
+            # The setting is read once for all messages to the user
+            disable_unicode = not self.bot.get_user_setting(userid, BotUserSettings.FORMATTING)
+            async with sending:
+                for report, message in reports:
+                    try:
+                        for elem in message:
+                            await self.send_bot_response(userid, elem, disable_unicode)
+                        self.bot.confirm_message_send(report, userid)
+                        self.log.warning(f"Sent report to {userid}")
+                    except MessengerError as e:
+                        self.log.exception(f"Can't send report: {e.code} {e.subcode} {e.message}", exc_info=e)
+                        self.bot.disable_user(userid)
+                        return
+
+        # An unexpected error for one user must not stop the reports to everybody else
+        results = await asyncio.gather(*[send_reports(userid, reports) for userid, reports in reports_by_user.items()],
+                                       return_exceptions=True)
+        for userid, result in zip(reports_by_user.keys(), results):
+            if isinstance(result, Exception):
+                self.log.exception(f"Could not send reports to {userid}", exc_info=result)
 
     async def send_message_to_users(self, message: str, users: List[Union[str, int]]):
         if not users:
             users = map(lambda x: x.platform_id, self.bot.get_all_users())
 
         message = UserHintService.format_commands(message, self.bot.command_formatter)
+        # The text only depends on the formatting setting, so it is adapted once for each setting instead of every user
+        adapted_messages = {just_strip: adapt_text(message, just_strip=just_strip) for just_strip in [False, True]}
+
+        sending = asyncio.Semaphore(self.MAX_CONCURRENT_USERS)
 
-        for user in users:
+        async def send(user: Union[str, int]):
             disable_unicode = not self.bot.get_user_setting(user, BotUserSettings.FORMATTING)
-            await self.fb_messenger.send_message(user, adapt_text(message, just_strip=disable_unicode))
+            async with sending:
+                await self.fb_messenger.send_message(user, adapted_messages[disable_unicode])
             self.log.warning(f"Sent message to {user}")
 
+        # A failed message to one user must not stop the messages to everybody else
+        users = list(users)
+        results = await asyncio.gather(*[send(user) for user in users], return_exceptions=True)
+        for user, result in zip(users, results):
+            if isinstance(result, Exception):
+                self.log.exception(f"Could not send message to {user}", exc_info=result)
+
     async def sendMessageToDev(self, message: str):
         self.log.error(f"Not yet implemented, send following to dev: {message}")
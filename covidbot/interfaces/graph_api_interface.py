@@ -0,0 +1,87 @@
+import asyncio
+import logging
+from abc import ABC
+from typing import List, Optional, Iterable, Tuple, Dict, IO
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from covidbot.covid_data import CovidData, Visualization
+from covidbot.interfaces.bot_response import BotResponse
+from covidbot.interfaces.single_command_interface import SingleCommandInterface, SingleArgumentRequest
+from covidbot.user_manager import UserManager
+
+
+class GraphAPIInterface(SingleCommandInterface, ABC):
+    """Common parts of the interfaces publishing to a node of the Facebook Graph API, like a page or an Instagram
+    account"""
+    log = logging.getLogger(__name__)
+
+    access_token: str
+    node_id: str
+    platform_name: str
+    session: requests.Session
+
+    def __init__(self, node_id: str, access_token: str, user_manager: UserManager, covid_data: CovidData,
+                 visualization: Visualization, no_write: bool = False):
+        super().__init__(user_manager, covid_data, visualization, 0, no_write)
+        self.node_id = node_id
+        self.access_token = access_token
+        # Reuse the connection to the Graph API instead of a new TLS handshake for each request
+        self.session = requests.Session()
+        # Retry transient errors, the last response is returned and handled like before if they do not resolve
+        lookup_retry = Retry(total=5, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504],
+                             allowed_methods=["GET"], respect_retry_after_header=True, raise_on_status=False)
+        self.session.mount("https://", HTTPAdapter(max_retries=lookup_retry))
+        # Publishing is not idempotent: after a server error or timeout, the post might exist already. Only rate limits
+        # and connection errors, where the request was not sent, are retried for the edges of the node.
+        publish_retry = Retry(total=5, read=0, other=0, backoff_factor=0.5, status_forcelist=[429],
+                              allowed_methods=["POST"], respect_retry_after_header=True, raise_on_status=False)
+        self.session.mount(f"https://graph.facebook.com/{self.node_id}/", HTTPAdapter(max_retries=publish_retry))
+
+    async def send_unconfirmed_reports(self) -> None:
+        # The follower count is fetched in the background while the reports are created, instead of blocking start up
+        followers = asyncio.get_running_loop().run_in_executor(None, self.get_follower_number)
+        try:
+            await super().send_unconfirmed_reports()
+        finally:
+            self.save_follower_number(await followers)
+
+    def get_follower_number(self) -> Optional[int]:
+        try:
+            response = self.session.get(f"https://graph.facebook.com/{self.node_id}",
+                                        params={'fields': 'followers_count', 'access_token': self.access_token},
+                                        timeout=10)
+        except requests.RequestException as e:
+            self.log.error(f"Could not fetch {self.platform_name} follower count", exc_info=e)
+            return None
+
+        if response.status_code != 200:
+            self.log.error(f"{self.platform_name} API returned {response.status_code}: {response.text}")
+            return None
+        return response.json()['followers_count']
+
+    def save_follower_number(self, number: Optional[int]) -> None:
+        # Written from the event loop, as the database connection is not shared with the executor thread
+        if number is not None:
+            self.user_manager.set_platform_user_number(number)
+
+    def post(self, edge: str, data: Dict[str, str], files: Optional[Dict[str, IO]] = None) -> requests.Response:
+        """Sends data to an edge of the node, like its feed"""
+        response = self.session.post(f"https://graph.facebook.com/{self.node_id}/{edge}",
+                                     data={**data, 'access_token': self.access_token}, files=files, timeout=30)
+        self.log.debug(response)
+        if response.status_code != 200:
+            self.log.error(f"{self.platform_name} API returned {response.status_code}: {response.text}")
+        return response
+
+    @staticmethod
+    def join_messages(messages: List[BotResponse]) -> Tuple[str, Optional[str]]:
+        """Returns the text of all responses and the first of their images, as a post can only have one"""
+        message_text = "".join(response.message + '\n\n' for response in messages)
+        media_file = next((response.images[0] for response in messages if response.images), None)
+        return message_text, media_file
+
+    def get_mentions(self) -> Iterable[SingleArgumentRequest]:
+        raise NotImplementedError(f"{self.__class__.__name__} does not support individual queries")
@@ -45,8 +45,12 @@ class MastodonInterface(SingleCommandInterface):
         for message in messages:
             media_ids = []
             if message.images:
+                # Mastodon does not attach media to a second status, so uploads are only reused within a toot
+                uploaded = {}
                 for file in message.images:
-                    media_ids.append(self.upload_media(file))
+                    if file not in uploaded:
+                        uploaded[file] = self.upload_media(file)
+                    media_ids.append(uploaded[file])
             try:
                 with API_RESPONSE_TIME.labels(platform='mastodon').time():
                     if not reply_obj:
@@ -77,15 +81,17 @@ class MastodonInterface(SingleCommandInterface):
     def get_mentions(self) -> Iterable[SingleArgumentRequest]:
         with API_RESPONSE_TIME.labels(platform='mastodon').time():
             notifications = self.mastodon.notifications(
-                exclude_types=['follow', 'favourite', 'reblog' 'poll', 'follow_request'])
+                exclude_types=['follow', 'favourite', 'reblog', 'poll', 'follow_request'])
         self.update_metrics()
         mentions = []
-        bot_name = "@D64_Covidbot"
+        bot_name = "@d64_covidbot"
         for n in notifications:
             if n['type'] != "mention":
                 continue
-            text = general_tag_pattern.sub("", n['status']['content'])
-            mention_pos = text.lower().find(bot_name.lower())
+            text = n['status']['content']
+            if '<' in text:
+                text = general_tag_pattern.sub("", text)
+            mention_pos = text.lower().find(bot_name)
             text = text[mention_pos + len(bot_name):]
             if text:
                 created = n['status']['created_at']
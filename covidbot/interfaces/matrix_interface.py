@@ -1,9 +1,11 @@
 import asyncio
+import io
 import logging
 import os
-from typing import List, Union, Optional
+from collections import defaultdict
+from typing import List, Union, Optional, Dict, Tuple
+from urllib.parse import urlparse
 
-import aiofiles
 import prometheus_async
 from PIL import Image
 from nio import AsyncClient, AsyncClientConfig, RoomMessageText, MatrixRoom, MegolmEvent, \
@@ -17,7 +19,7 @@ from covidbot.interfaces.bot_response import BotResponse
 from covidbot.interfaces.messenger_interface import MessengerInterface
 from covidbot.metrics import RECV_MESSAGE_COUNT, SENT_MESSAGE_COUNT, FAILED_MESSAGE_COUNT, \
     BOT_RESPONSE_TIME, SENT_IMAGES_COUNT
-from covidbot.utils import adapt_text
+from covidbot.utils import adapt_text, MessageType
 
 
 class MatrixInterface(MessengerInterface):
@@ -35,6 +37,15 @@ class MatrixInterface(MessengerInterface):
     public_url: str
     web_dir: str
     debug: bool
+    image_cache: Dict[Tuple[str, float], dict]
+
+    IMAGE_CACHE_SIZE = 256
+    # Number of rooms that are sent messages to at the same time
+    MAX_CONCURRENT_ROOMS = 8
+    # Seconds in which sync requests of event handlers are combined into a single sync
+    SYNC_COALESCE_TIME = 0.5
+    pending_sync: Optional[asyncio.Future] = None
+    pending_sync_full_state: bool = False
 
     def __init__(self, bot: Bot, home_server: str, username: str, access_token: str,
                  device_id: str, store_filepath: str, web_dir: str, public_url: str,
@@ -44,6 +55,7 @@ class MatrixInterface(MessengerInterface):
             os.makedirs(store_filepath)
 
         self.debug = debug
+        self.image_cache = {}
         self.public_url = public_url
         self.web_dir = web_dir
 
@@ -51,7 +63,7 @@ class MatrixInterface(MessengerInterface):
         self.avatar_path = avatar_path
 
         self.username = username
-        self.identifier = f"@{username}:{home_server[home_server.find('//') + 2:]}"
+        self.identifier = f"@{username}:{urlparse(home_server).netloc or home_server}"
 
         self.matrix = AsyncClient(home_server, self.identifier, device_id,
                                   store_path=store_filepath,
@@ -80,7 +92,7 @@ class MatrixInterface(MessengerInterface):
             resp = await self.matrix.request_room_key(event)
             if isinstance(resp, RoomKeyRequestResponse):
                 self.log.info(f"Got Response for {resp.room_id}, start syncing")
-                await self.matrix.sync(full_state=True)
+                await self.coalesced_sync(full_state=True)
                 self.log.info("Finished sync")
             elif isinstance(resp, RoomKeyRequestError):
                 self.log.error(f"Got Error for requesting room key: {resp}")
@@ -97,7 +109,7 @@ class MatrixInterface(MessengerInterface):
                 f"Can't Join {room.room_id} ({room.encrypted}): {JoinError.message}")
             return
 
-        await self.matrix.sync()
+        await self.coalesced_sync()
         self.log.debug(f"Joined room {room.name}")
 
         await self.send_response(room.room_id, self.bot.handle_input('Start', room.room_id))
@@ -105,6 +117,24 @@ class MatrixInterface(MessengerInterface):
         if room.member_count > 2:
             await self.send_response(room.room_id, [BotResponse("Noch ein Hinweis: Da wir hier nicht zu zweit sind reagiere ich nur auf mentions!")])
 
+    async def coalesced_sync(self, full_state: bool = False) -> None:
+        """
+        Syncs once for all handlers requesting it within SYNC_COALESCE_TIME, e.g. for a burst of invites on start up
+        """
+        self.pending_sync_full_state |= full_state
+        if not self.pending_sync:
+            self.pending_sync = asyncio.ensure_future(self.delayed_sync())
+        # A cancelled handler must not cancel the sync other handlers are waiting for
+        await asyncio.shield(self.pending_sync)
+
+    async def delayed_sync(self) -> None:
+        await asyncio.sleep(self.SYNC_COALESCE_TIME)
+        # Requests from now on need another sync, as it might have started before their change
+        full_state = self.pending_sync_full_state
+        self.pending_sync = None
+        self.pending_sync_full_state = False
+        await self.matrix.sync(full_state=full_state)
+
     async def room_event(self, room: MatrixRoom, event: RoomMemberEvent):
         self.log.debug(f"Got RoomEvent: {event}")
         if event.membership == "leave" and event.state_key != self.matrix.user_id:
@@ -151,26 +181,9 @@ class MatrixInterface(MessengerInterface):
         for message in responses:
             if message.images:
                 for image in message.images:
-                    # Calculate metadata
-                    mime_type = "image/jpeg"
-                    file_stat = os.stat(image)
-
-                    im = Image.open(image)
-                    (width, height) = im.size
-
-                    url = await self.upload_file(image, mime_type)
-
-                    image = {
-                        "body": os.path.basename(image),
-                        "msgtype": "m.image",
-                        "url": url,
-                        "info": {
-                            "size": file_stat.st_size,
-                            "mimetype": mime_type,
-                            "w": width,  # width in pixel
-                            "h": height,  # height in pixel
-                        },
-                    }
+                    image = await self.get_image_content(image)
+                    if not image:
+                        continue
 
                     resp = await self.matrix.room_send(
                         room_id=room_id,
@@ -183,15 +196,17 @@ class MatrixInterface(MessengerInterface):
                     else:
                         SENT_IMAGES_COUNT.inc()
 
+            text = str(message)
+            content = {"msgtype": "m.text", "body": adapt_text(text, just_strip=True)}
+            # Without tags or line breaks, the HTML version would just repeat the plain text
+            if "<" in text or "\n" in text:
+                content["format"] = "org.matrix.custom.html"
+                content["formatted_body"] = text.replace("\n", "<br />")
+
             resp = await self.matrix.room_send(
                 room_id=room_id,
                 message_type="m.room.message",
-                content={
-                    "msgtype": "m.text",
-                    "body": adapt_text(str(message), just_strip=True),
-                    "format": "org.matrix.custom.html",
-                    "formatted_body": str(message).replace("\n", "<br />")
-                },
+                content=content,
                 ignore_unverified_devices=True
             )
             if isinstance(resp, ErrorResponse):
@@ -200,15 +215,52 @@ class MatrixInterface(MessengerInterface):
             else:
                 SENT_MESSAGE_COUNT.inc()
 
-    async def upload_file(self, path: str, mime_type: str) -> Optional[str]:
+    async def get_image_content(self, path: str) -> Optional[dict]:
+        """Returns the content of an image message, the same graph is only inspected and uploaded once"""
+        mtime = os.path.getmtime(path)
+        if (path, mtime) in self.image_cache:
+            return self.image_cache[(path, mtime)]
+
+        # Reading the image header blocks, so it is done outside of the event loop
+        loop = asyncio.get_running_loop()
+        size, (width, height), mime_type = await loop.run_in_executor(None, self.probe_image, path)
+        url = await self.upload_file(path, mime_type)
+        if not url:
+            return None
+
+        content = {
+            "body": os.path.basename(path),
+            "msgtype": "m.image",
+            "url": url,
+            "info": {
+                "size": size,
+                "mimetype": mime_type,
+                "w": width,  # width in pixel
+                "h": height,  # height in pixel
+            },
+        }
+        if len(self.image_cache) >= self.IMAGE_CACHE_SIZE:
+            del self.image_cache[next(iter(self.image_cache))]
+        self.image_cache[(path, mtime)] = content
+        return content
+
+    @staticmethod
+    def probe_image(path: str) -> Tuple[int, Tuple[int, int], str]:
+        """Returns file size, dimensions and mime type of an image"""
         file_stat = os.stat(path)
+        with Image.open(path) as im:
+            return file_stat.st_size, im.size, im.get_format_mimetype()
+
+    async def upload_file(self, path: str, mime_type: str) -> Optional[str]:
+        # The images are small, so they are read at once instead of in chunks through aiofiles
+        with open(path, "rb") as f:
+            data = await asyncio.get_running_loop().run_in_executor(None, f.read)
 
-        async with aiofiles.open(path, "r+b") as f:
-            resp, maybe_keys = await self.matrix.upload(
-                f,
-                content_type=mime_type,
-                filename=os.path.basename(path),
-                filesize=file_stat.st_size)
+        resp, maybe_keys = await self.matrix.upload(
+            io.BytesIO(data),
+            content_type=mime_type,
+            filename=os.path.basename(path),
+            filesize=len(data))
 
         if not isinstance(resp, UploadResponse):
             self.log.error(f"Failed to upload file. Failure response: {resp}")
@@ -245,27 +297,50 @@ class MatrixInterface(MessengerInterface):
         asyncio.get_event_loop().run_until_complete(self.async_run())
 
     async def send_unconfirmed_reports(self) -> None:
-        unconfirmed_reports = self.bot.get_available_user_messages()
+        # Messages to the same room have to keep their order, so they are sent one after another
+        reports_by_room: Dict[str, List[Tuple[MessageType, List[BotResponse]]]] = defaultdict(list)
+        for report, userid, message in self.bot.get_available_user_messages():
+            reports_by_room[userid].append((report, message))
 
-        if unconfirmed_reports:
+        if reports_by_room:
             await self.matrix.sync(full_state=True)
 
-        for report, userid, message in unconfirmed_reports:
-            if not userid in self.matrix.rooms:
+        sending = asyncio.Semaphore(self.MAX_CONCURRENT_ROOMS)
+
+        async def send_reports(userid: str, reports: List[Tuple[MessageType, List[BotResponse]]]):
+            if userid not in self.matrix.rooms:
                 self.log.error(f"Room {userid} does not exist")
                 self.bot.disable_user(userid)
-                continue
+                return
 
-            try:
-                await self.send_response(userid, message)
-            except LocalProtocolError as e:
-                self.log.warning(f"Error while sending report to {userid}: {e}")
-            else:
-                self.bot.confirm_message_send(report, userid)
-                self.log.warning(f"Sent report to {userid}")
+            async with sending:
+                for report, message in reports:
+                    try:
+                        await self.send_response(userid, message)
+                    except LocalProtocolError as e:
+                        self.log.warning(f"Error while sending report to {userid}: {e}")
+                    else:
+                        self.bot.confirm_message_send(report, userid)
+                        self.log.warning(f"Sent report to {userid}")
+
+        # An unexpected error in one room must not stop the reports to all other rooms
+        results = await asyncio.gather(*[send_reports(userid, reports) for userid, reports in reports_by_room.items()],
+                                       return_exceptions=True)
+        for userid, result in zip(reports_by_room.keys(), results):
+            if isinstance(result, Exception):
+                self.log.exception(f"Could not send reports to {userid}", exc_info=result)
 
         await self.matrix.close()
 
     async def send_message_to_users(self, message: str, users: List[Union[str, int]]):
-        for user in users:
-            await self.send_response(user, [BotResponse(message)])
+        users = list(users)
+        sending = asyncio.Semaphore(self.MAX_CONCURRENT_ROOMS)
+
+        async def send(user: Union[str, int]):
+            async with sending:
+                await self.send_response(user, [BotResponse(message)])
+
+        results = await asyncio.gather(*[send(user) for user in users], return_exceptions=True)
+        for user, result in zip(users, results):
+            if isinstance(result, Exception):
+                self.log.exception(f"Could not send message to {user}", exc_info=result)
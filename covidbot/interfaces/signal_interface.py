@@ -5,7 +5,6 @@ import queue
 import random
 import re
 import signal
-import time
 import traceback
 from dataclasses import dataclass
 from math import ceil
@@ -28,6 +27,8 @@ from covidbot.user_hint_service import UserHintService
 from covidbot.utils import adapt_text
 from covidbot.interfaces.bot_response import BotResponse
 
+maps_link_pattern = re.compile(r'\nhttps://maps\.google\.com/maps\?q=.*')
+
 
 @dataclass
 class SignalSendElem:
@@ -49,6 +50,8 @@ class SignalInterface(MessengerInterface):
     bot: Bot
     log = logging.getLogger(__name__)
     message_queue: asyncio.Queue
+    # Seconds a rate limited recipient is paused at first, doubled on every further rate limit
+    MIN_RECIPIENT_BACKOFF = 5
 
     def __init__(self, bot: Bot, phone_number: str, socket: str, dev_chat: str):
         self.bot = bot
@@ -67,25 +70,55 @@ class SignalInterface(MessengerInterface):
     async def message_sender(self):
         self.log.debug("Initializing Sender")
         backoff_time = 1
-
-        while await asyncio.sleep(0.1) is None:
-            if not self.message_queue.empty():
-                message = self.message_queue.get_nowait()
-                self.log.debug(f"Got item for {message.context.message.source.uuid} from queue")
+        # Rate limited recipients are paused on their own, so they do not hold up the replies to everybody else
+        recipient_backoff: Dict[str, float] = {}
+        postponed: Dict[str, List[SignalSendElem]] = {}
+        loop = asyncio.get_running_loop()
+
+        def resume(recipient: str):
+            for postponed_item in postponed.pop(recipient):
+                self.message_queue.put_nowait(postponed_item)
+
+        while True:
+            # Wait for a reply, then send it together with everything queued in the meantime
+            item = await self.message_queue.get()
+            pending: Dict[str, List[SignalSendElem]] = {item.context.message.source.uuid: [item]}
+            while not self.message_queue.empty():
+                item = self.message_queue.get_nowait()
+                pending.setdefault(item.context.message.source.uuid, []).append(item)
+
+            for uuid, items in pending.items():
+                if uuid in postponed:
+                    self.log.debug(f"Postpone {len(items)} items for rate limited {uuid}")
+                    postponed[uuid].extend(items)
+                    for _ in items:
+                        self.message_queue.task_done()
+                    continue
+
+                self.log.debug(f"Got {len(items)} items for {uuid} from queue")
                 try:
-                    await message.context.message.typing_started()
-                    for m in message.messages:
-                        await self.send_reply(message.context, m)
-                    await message.context.message.typing_stopped()
+                    await items[0].context.message.typing_started()
+                    for item in items:
+                        # Sent messages are removed, so only the remaining ones are retried after a rate limit
+                        while item.messages:
+                            await self.send_reply(item.context, item.messages[0])
+                            item.messages.pop(0)
+                    await items[0].context.message.typing_stopped()
                 except RateLimitError as e:
-                    self.log.warning(f"Got rate limited, current backoff: {backoff_time} seconds")
-                    rate_limited = True
+                    if uuid in recipient_backoff:
+                        recipient_backoff[uuid] *= 2
+                    else:
+                        recipient_backoff[uuid] = self.MIN_RECIPIENT_BACKOFF
+                    self.log.warning(f"Got rate limited for {uuid}, retry in {recipient_backoff[uuid]} seconds")
+                    postponed[uuid] = [item for item in items if item.messages]
+                    loop.call_later(recipient_backoff[uuid], resume, uuid)
                 else:
-                    rate_limited = False
-                    self.message_queue.task_done()
+                    recipient_backoff.pop(uuid, None)
+                finally:
+                    for _ in items:
+                        self.message_queue.task_done()
 
-                backoff_time = self.backoff_timer(backoff_time, rate_limited)
-                await asyncio.sleep(backoff_time)
+                backoff_time = await self.backoff_timer(backoff_time, False)
 
     async def run_bot(self):
         self.log.debug("Initializing Bot")
@@ -118,9 +151,9 @@ class SignalInterface(MessengerInterface):
         text = ctx.message.get_body()
         self.log.debug(f"Got message {text}")
         if text:
-            if text.find('https://maps.google.com/maps?q='):
+            if 'https://maps.google.com/maps?q=' in text:
                 # This is a location
-                text = re.sub('\nhttps://maps.google.com/maps\?q=.*', '', text)
+                text = maps_link_pattern.sub('', text)
                 # Strip URL so it is searched for the contained address
             platform_id = ctx.message.source.uuid
 
@@ -155,7 +188,7 @@ class SignalInterface(MessengerInterface):
         """
         Returns an attachement dict to send an image with signald, containing a file path to the graphic
         """
-        return Attachment(filename, width=1600, height=1000)
+        return Attachment(filename, width=1280, height=800)
 
     async def send_unconfirmed_reports(self) -> None:
         """
@@ -236,7 +269,7 @@ class SignalInterface(MessengerInterface):
                     self.log.error(
                         f"({message_counter}) Error sending daily report to {userid}")
 
-                backoff_time = self.backoff_timer(backoff_time, rate_limited)
+                backoff_time = await self.backoff_timer(backoff_time, rate_limited)
                 message_counter += 1
 
     async def send_message_to_users(self, message: str, users: List[str]) -> None:
@@ -261,7 +294,7 @@ class SignalInterface(MessengerInterface):
                 await bot.send_message(user, adapt_text(str(message),
                                                         just_strip=disable_unicode))
 
-    def backoff_timer(self, current_backoff: float, failed: bool) -> float:
+    async def backoff_timer(self, current_backoff: float, failed: bool) -> float:
         """
         Sleeps and calculates the new backoff time, depending whether sending the message failed or not
         Args:
@@ -282,7 +315,7 @@ class SignalInterface(MessengerInterface):
             self.log.warning(f"New backoff time: {new_backoff}s")
 
         self.log.info(f"Sleeping {new_backoff}s to avoid server limitations")
-        time.sleep(new_backoff)
+        await asyncio.sleep(new_backoff)
         return new_backoff
 
     async def send_to_dev(self, message: str, bot: semaphore.Bot):
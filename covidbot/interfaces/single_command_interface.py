@@ -184,7 +184,8 @@ class SingleCommandInterface(MessengerInterface, ABC):
         return post
 
     def get_infection_shortpost(self, district_id: int) -> List[BotResponse]:
-        graphs = [self.viz.incidence_graph(district_id), self.viz.infections_graph(district_id)]
+        graphs = [self.viz.submit(self.viz.incidence_graph, district_id),
+                  self.viz.submit(self.viz.infections_graph, district_id)]
         district = self.data.get_district_data(district_id)
         date_str = "Am " + district.date.strftime('%d. %B %Y')
         if district.date == datetime.date.today() - datetime.timedelta(days=1):
@@ -200,9 +201,9 @@ class SingleCommandInterface(MessengerInterface, ABC):
         #    graphs.append(self.viz.vaccination_graph(district_id))
 
         if district.icu_data:
-            graphs.append(self.viz.icu_graph(district_id))
+            graphs.append(self.viz.submit(self.viz.icu_graph, district_id))
 
-        return [BotResponse(tweet_text, graphs)]
+        return [BotResponse(tweet_text, [graph.result() for graph in graphs])]
 
     async def send_message_to_users(self, message: str, users: List[Union[str, int]], append_report=False):
         if users:
@@ -3,6 +3,7 @@ import datetime
 from typing import Tuple, List, Callable, Optional
 
 from covidbot.covid_data import Visualization, CovidData, DistrictData
+from covidbot.covid_data.models import District
 from covidbot.interfaces.bot_response import BotResponse, UserChoice
 from covidbot.settings import BotUserSettings
 from covidbot.user_hint_service import UserHintService
@@ -76,13 +77,59 @@ class ReportGenerator:
             return self.generate_icu_report(user)
         return []
 
+    @staticmethod
+    def get_multi_incidence_districts(user: BotUser) -> List[int]:
+        """Up to 8 subscribed districts for the multi-incidence graph, always including Germany if subscribed"""
+        districts = user.subscriptions[-8:]
+        if 0 in user.subscriptions and 0 not in districts:
+            districts[0] = 0
+        return districts
+
+    def get_infection_report_graphs(self, user: BotUser, districts: List[District]) \
+            -> List[Tuple[Callable[..., Optional[str]], tuple]]:
+        """
+        Returns the graphs of the infection report as (graph, arguments), used by generate_infection_report and to
+        create them beforehand
+        :param districts: Subscribed districts of the user, sorted like in the report
+        """
+        report_graphics = self.user_manager.get_user_setting(user.id, BotUserSettings.REPORT_GRAPHICS)
+        every_graph = self.user_manager.get_user_setting(user.id, BotUserSettings.REPORT_ALL_INFECTION_GRAPHS)
+
+        graphs = []
+        countries = [d for d in districts if d.type == "Staat"]
+        if report_graphics:
+            for c in countries:
+                graphs.append((self.visualization.infections_graph, (c.id,)))
+                # Remove graphic, as it is misleading
+                #graphs.append((self.visualization.hospitalization_graph, (c.id,)))
+
+        # The first country is shown in the introduction, all other subscriptions get a summary
+        if every_graph:
+            for district in districts:
+                if not countries or district.id != countries[0].id:
+                    graphs.append((self.visualization.infections_graph, (district.id,)))
+
+        # Generate multi-incidence graph for up to 8 districts
+        if report_graphics:
+            multi_districts = tuple(self.get_multi_incidence_districts(user))
+            graphs.append((self.visualization.multi_incidence_graph, (multi_districts,)))
+        return graphs
+
+    def get_infection_reports_graphs(self, users: List[BotUser]) -> List[Tuple[Callable[..., Optional[str]], tuple]]:
+        """Returns the graphs of the infection reports of several users, looking up their districts at once"""
+        districts = self.covid_data.get_districts(d for user in users for d in user.subscriptions)
+        graphs = []
+        for user in users:
+            subscriptions = self.sort_districts([districts[d] for d in user.subscriptions if d in districts])
+            graphs += self.get_infection_report_graphs(user, subscriptions)
+        return graphs
+
     def generate_infection_report(self, user: BotUser) -> List[BotResponse]:
         # Send How-To use if no subscriptions
         if not user.subscriptions:
             return self.get_how_to()
 
         # Start creating report
-        graphs = []
         subscriptions = []
         for district_id in user.subscriptions:
             base_data = self.covid_data.get_district_data(district_id)
@@ -96,11 +143,7 @@ class ReportGenerator:
 
         # Short introduction overview for first country subscribed to
         countries = list(filter(lambda d: d.type == "Staat", subscriptions))
-        for c in countries:
-            if self.user_manager.get_user_setting(user.id, BotUserSettings.REPORT_GRAPHICS):
-                graphs.append(self.visualization.infections_graph(c.id))
-                # Remove graphic, as it is misleading
-                #graphs.append(self.visualization.hospitalization_graph(c.id))
+        graphs = [graph(*args) for graph, args in self.get_infection_report_graphs(user, subscriptions)]
 
         country = None
         if countries:
@@ -110,23 +153,12 @@ class ReportGenerator:
 
         # Short summary for each subscribed district
         if subscriptions and len(subscriptions) > 0:
-            every_graph = self.user_manager.get_user_setting(user.id, BotUserSettings.REPORT_ALL_INFECTION_GRAPHS)
-
             for district in subscriptions:
                 message += self.get_district_summary(district,
                                                      self.user_manager.get_user_setting(user.id, BotUserSettings.REPORT_INCLUDE_ICU),
                                                      self.user_manager.get_user_setting(user.id, BotUserSettings.REPORT_INCLUDE_VACCINATION))
-                if every_graph:
-                    graphs.append(self.visualization.infections_graph(district.id))
                 message += "\n\n"
 
-        # Generate multi-incidence graph for up to 8 districts
-        if self.user_manager.get_user_setting(user.id, BotUserSettings.REPORT_GRAPHICS):
-            districts = user.subscriptions[-8:]
-            if 0 in user.subscriptions and 0 not in districts:
-                districts[0] = 0
-            graphs.append(self.visualization.multi_incidence_graph(districts))
-
         # Add some information regarding vaccinations, if available:
         # Data is not refreshed anymore
         if False and country and country.vaccinations and \
@@ -0,0 +1,36 @@
+from unittest import TestCase
+
+# Resolves the circular import between covidbot.utils and covidbot.covid_data, like the other tests do via __main__
+import covidbot.covid_data  # noqa: F401
+from covidbot.feedback_notifier import batch_notifications, MAX_MESSAGE_LENGTH, FEEDBACK_SEPARATOR
+
+
+class TestFeedbackNotifier(TestCase):
+    def test_batch_notifications(self):
+        self.assertEqual([], batch_notifications([]), "No notifications should result in no messages")
+
+        batches = batch_notifications([(1, "Feedback 1"), (2, "Feedback 2")])
+        self.assertEqual([([1, 2], "Feedback 1" + FEEDBACK_SEPARATOR + "Feedback 2")], batches,
+                         "Short notifications should be combined into a single message")
+
+        batches = batch_notifications([(1, "a" * 2000), (2, "b" * 2000), (3, "c" * 2000)])
+        self.assertEqual([[1, 2], [3]], [feedback_ids for feedback_ids, _ in batches],
+                         "A new message should be started once the maximum length is reached")
+        for _, message in batches:
+            self.assertLessEqual(len(message), MAX_MESSAGE_LENGTH, "Messages should not exceed the maximum length")
+
+    def test_batch_long_notification(self):
+        lines = "\n".join(["Zeile"] * 1000)
+        batches = batch_notifications([(1, lines), (2, "Feedback 2")])
+        self.assertEqual(2, len(batches), "An over-long notification should be split into two messages")
+        first_part, second_part = batches[0][1], batches[1][1][:-len(FEEDBACK_SEPARATOR + "Feedback 2")]
+        self.assertLessEqual(len(first_part), MAX_MESSAGE_LENGTH, "Messages should not exceed the maximum length")
+        self.assertEqual(lines, first_part + "\n" + second_part,
+                         "An over-long notification should be split at a line break without losing text")
+        self.assertEqual([[], [1, 2]], [feedback_ids for feedback_ids, _ in batches],
+                         "An over-long notification should only be confirmed with its last part")
+
+        batches = batch_notifications([(1, "x" * (2 * MAX_MESSAGE_LENGTH + 10))])
+        self.assertEqual([MAX_MESSAGE_LENGTH, MAX_MESSAGE_LENGTH, 10], [len(message) for _, message in batches],
+                         "A notification without line breaks should be split at the maximum length")
+        self.assertEqual([[], [], [1]], [feedback_ids for feedback_ids, _ in batches])
@@ -181,6 +181,22 @@ class TestSubscriptionManager(TestCase):
                              "Same Feedback should be added successfully")
         self.assertIsNone(self.test_manager.add_feedback(user_id, ""), "Null Feedback should not be added successfully")
 
+    def test_feedback_notifications(self):
+        user_id = self.test_manager.get_user_id("testuser1")
+        first_id = self.test_manager.add_feedback(user_id, "I quite like it!")
+        second_id = self.test_manager.add_feedback(user_id, "Still like it!")
+
+        notifications = self.test_manager.get_feedback_notifications()
+        self.assertEqual([first_id, second_id], [feedback_id for feedback_id, _ in notifications],
+                         "New feedback should be returned for notifications")
+        self.assertEqual(notifications, self.test_manager.get_feedback_notifications(),
+                         "Feedback should not be marked as sent before it is confirmed")
+
+        self.test_manager.confirm_feedback_notifications([first_id])
+        self.assertEqual([second_id], [feedback_id for feedback_id, _ in
+                                       self.test_manager.get_feedback_notifications()],
+                         "Confirmed feedback should not be returned again")
+
     def test_get_most_subscriptions(self):
         self.assertEqual(0, self.test_manager.get_most_subscriptions(), "Without users 0 should be the number of most "
                                                                         "subscriptions")
@@ -1,9 +1,54 @@
+import datetime
+import tempfile
 from unittest import TestCase
 
+import numpy as np
+
 from covidbot.covid_data import Visualization
 
 
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def execute(self, query, params=None):
+        pass
+
+    def fetchall(self):
+        return self.rows
+
+
+class FakeConnection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def cursor(self, **kwargs):
+        return FakeCursor(self.rows)
+
+
 class TestVisualization(TestCase):
     def test_tick_formatter_german_numbers(self):
         self.assertEqual("1,1 Mio.", Visualization.tick_formatter_german_numbers(1100000, 0))
         self.assertEqual("900.000", Visualization.tick_formatter_german_numbers(900000, 0))
+
+    def test_get_covid_data_fills_gaps(self):
+        today = datetime.date.today()
+        rows = [(today - datetime.timedelta(days=4), 10, "Testkreis"),
+                (today - datetime.timedelta(days=3), 20, "Testkreis"),
+                (today, 50, "Testkreis")]
+
+        with tempfile.TemporaryDirectory() as directory:
+            visualization = Visualization(FakeConnection(rows), directory, disable_cache=True)
+            name, current_date, x_data, y_data = visualization._get_covid_data("new_cases", 1, 7)
+
+        self.assertEqual("Testkreis", name)
+        self.assertEqual(today, current_date)
+        self.assertEqual([10, 20, 0, 0, 50], y_data.tolist(), "Missing days should be filled with 0")
+        expected_days = np.arange(np.datetime64(today - datetime.timedelta(days=4)), np.datetime64(today) + 1)
+        self.assertEqual(expected_days.tolist(), x_data.tolist(), "x_data should contain every day without gaps")
@@ -1,7 +1,7 @@
 import logging
 from dataclasses import dataclass
 from datetime import datetime
-from typing import List, Optional, Tuple, Union, Generator
+from typing import List, Optional, Tuple, Union
 
 from mysql.connector import MySQLConnection, IntegrityError, OperationalError
 
@@ -389,15 +389,23 @@ class UserManager(object):
                 return new_id
             return None
 
-    def get_feedback_notifications(self) -> Generator[str, None, None]:
+    def get_feedback_notifications(self) -> List[Tuple[int, str]]:
+        """Returns id and notification text of new feedback, confirm_feedback_notifications marks it as sent"""
         with self.connection.cursor(dictionary=True) as cursor:
             cursor.execute('SELECT id, user_id, feedback FROM user_feedback WHERE notification_sent=0 and is_read=0 '
                            'ORDER BY added')
-            for row in cursor.fetchall():
-                yield f"<b>Neues Feedback von {row['user_id']}</b>\n" \
-                      f"{row['feedback']}\n\n" \
-                      f"Antworten: https://covidbot.d-64.org/feedback/user/{row['user_id']}"
-                cursor.execute('UPDATE user_feedback SET notification_sent=1 WHERE id=%s', [row['id']])
+            return [(row['id'], f"<b>Neues Feedback von {row['user_id']}</b>\n"
+                                f"{row['feedback']}\n\n"
+                                f"Antworten: https://covidbot.d-64.org/feedback/user/{row['user_id']}")
+                    for row in cursor.fetchall()]
+
+    def confirm_feedback_notifications(self, feedback_ids: List[int]) -> None:
+        if not feedback_ids:
+            return
+
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'UPDATE user_feedback SET notification_sent=1 '
+                           f'WHERE id IN ({", ".join(["%s"] * len(feedback_ids))})', feedback_ids)
         self.connection.commit()
 
     def is_message_answered(self, message_id: int) -> bool: